@@ -0,0 +1,238 @@
+#
+# monte carlo balancing runner: spreads seeded simulate.py games over a
+# process pool and merges per-level histograms of the results.
+#
+#   python balance.py -n 2000 -p greedy
+#
+# each worker plays a chunk of seeds and sends back a Balance of just
+# those games, the parent merges them as they stream in. the report has,
+# for every level: hp when leaving it, turns to death, deaths per visit
+# and how many of the quests given there were completed.
+#
+
+import os
+import sys
+import time
+import json
+import optparse
+import multiprocessing
+
+os.environ.setdefault("TOPDOG_HEADLESS", "1")
+
+import simulate
+
+# histogram bucket sizes
+HP_BUCKET = 10
+DEATH_BUCKET = 50
+
+
+class Histogram(object):
+    """
+        Counts of values in buckets of width.
+    """
+    def __init__(self, width):
+        self.width = width
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+
+    def add(self, value, count=1):
+        bucket = int(value // self.width) * self.width
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += count
+        self.sum += value * count
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+
+    def mean(self):
+        if self.total:
+            return float(self.sum) / self.total
+
+    def __str__(self):
+        return " ".join("%s:%s" % (bucket, self.counts[bucket])
+                        for bucket in sorted(self.counts))
+
+
+class LevelBalance(object):
+    """
+        Merged results for one level.
+    """
+    def __init__(self):
+        self.visits = 0
+        self.turns = 0
+        self.hp = Histogram(HP_BUCKET)
+        self.death_turns = Histogram(DEATH_BUCKET)
+        self.quests = 0
+        self.completed = 0
+
+    def add(self, record):
+        self.visits += 1
+        self.turns += record["turns"]
+        self.hp.add(record["hp_out"])
+        for turns in record["deaths"]:
+            self.death_turns.add(turns)
+        self.quests += record["quests"]
+        self.completed += record["completed"]
+
+    def merge(self, other):
+        self.visits += other.visits
+        self.turns += other.turns
+        self.hp.merge(other.hp)
+        self.death_turns.merge(other.death_turns)
+        self.quests += other.quests
+        self.completed += other.completed
+
+
+class Balance(object):
+    """
+        Merged results of many games, by level.
+    """
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.turns = 0
+        self.levels = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, stats):
+        self.games += 1
+        self.wins += stats["won"] and 1 or 0
+        self.turns += stats["turns"]
+        for record in stats["levels"]:
+            level = self.levels.setdefault(record["level"], LevelBalance())
+            level.add(record)
+
+    def merge(self, other):
+        self.games += other.games
+        self.wins += other.wins
+        self.turns += other.turns
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        for number, other_level in other.levels.items():
+            level = self.levels.setdefault(number, LevelBalance())
+            level.merge(other_level)
+
+    def report(self):
+        lines = ["%s games, %s won, %s turns" % (self.games, self.wins, self.turns)
+                , "level  visits  mean hp  deaths/visit  mean turns to death"
+                  "  quests done"]
+        for number in sorted(self.levels):
+            level = self.levels[number]
+            death_mean = level.death_turns.mean()
+            lines.append("%5s  %6s  %7.1f  %12.2f  %20s  %5s/%-5s"
+                    % (number, level.visits, level.hp.mean()
+                    , float(level.death_turns.total) / level.visits
+                    , death_mean is None and "-" or "%.0f" % (death_mean)
+                    , level.completed, level.quests))
+            lines.append("       hp out: %s" % (level.hp))
+            if level.death_turns.total:
+                lines.append("       turns to death: %s" % (level.death_turns))
+        return "\n".join(lines)
+
+    def as_dict(self):
+        return {
+            "games": self.games
+            ,"wins": self.wins
+            ,"turns": self.turns
+            ,"levels": dict((number, {
+                "visits": level.visits
+                ,"turns": level.turns
+                ,"hp_out": level.hp.counts
+                ,"turns_to_death": level.death_turns.counts
+                ,"quests": level.quests
+                ,"completed": level.completed
+                }) for number, level in self.levels.items())
+            }
+
+
+#=========================================================[[ Workers ]]
+worker_options = None
+
+def init_worker(options):
+    global worker_options
+    worker_options = options
+    simulate.setup(options["thirst"], options["weak_dice"]
+                , options["progression"], options["cache"])
+
+def play_chunk(seeds):
+    """
+        Play a chunk of seeds in a worker, return their merged Balance.
+    """
+    balance = Balance()
+    bot_class = simulate.BOTS[worker_options["policy"]]
+    cache = simulate.topdog.level_cache
+    if cache:
+        hits, misses = cache.hits, cache.misses
+    for seed in seeds:
+        balance.add(simulate.play_game(seed, bot_class
+                                    , worker_options["max_turns"]))
+    if cache:
+        balance.cache_hits = cache.hits - hits
+        balance.cache_misses = cache.misses - misses
+    return balance
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [options]"
+                , description="Play seeded games on all cores and report "
+                              "per-level balance.")
+    parser.add_option("-n", "--games", type="int", default=200
+                , help="games to play (default %default)")
+    parser.add_option("-s", "--seed", type="int", default=0
+                , help="seed of the first game, each next game adds one")
+    parser.add_option("-p", "--policy", choices=sorted(simulate.BOTS)
+                , default="greedy"
+                , help="bot policy: %s (default %%default)"
+                        % (", ".join(sorted(simulate.BOTS))))
+    parser.add_option("-t", "--max-turns", type="int"
+                , default=simulate.MAX_TURNS
+                , help="turn limit per game (default %default)")
+    parser.add_option("-j", "--jobs", type="int"
+                , default=multiprocessing.cpu_count()
+                , help="worker processes (default %default)")
+    parser.add_option("-c", "--chunk", type="int", default=10
+                , help="games per worker task (default %default)")
+    parser.add_option("-o", "--out", default=None
+                , help="also write the merged histograms here as json")
+    parser.add_option("--cache", default=None
+                , help="cache built levels in this directory, replaying "
+                       "the same seeds loads them from there")
+    simulate.add_tuning_options(parser)
+    options, args = parser.parse_args(argv)
+
+    worker = dict((name, getattr(options, name)) for name in
+                ("policy", "max_turns", "thirst", "weak_dice", "progression"
+                , "cache"))
+    if options.progression:
+        worker["progression"] = os.path.abspath(options.progression)
+    seeds = range(options.seed, options.seed + options.games)
+    chunks = [seeds[i:i + options.chunk]
+                for i in range(0, len(seeds), options.chunk)]
+    pool = multiprocessing.Pool(options.jobs, init_worker, (worker,))
+    balance = Balance()
+    started = time.time()
+    for part in pool.imap_unordered(play_chunk, chunks):
+        balance.merge(part)
+        sys.stderr.write("\r%s/%s games" % (balance.games, options.games))
+    pool.close()
+    pool.join()
+    elapsed = max(time.time() - started, 1e-6)
+    sys.stderr.write("\r%s games in %.1fs on %s processes: %d turns/s\n"
+                    % (balance.games, elapsed, options.jobs
+                    , balance.turns / elapsed))
+    if options.cache:
+        sys.stderr.write("level cache: %s hits, %s misses\n"
+                        % (balance.cache_hits, balance.cache_misses))
+    print(balance.report())
+    if options.out:
+        f = open(options.out, "w")
+        json.dump(balance.as_dict(), f, sort_keys=True)
+        f.close()
+
+
+if __name__ == "__main__":
+    main()
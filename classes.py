@@ -1,26 +1,174 @@
 import os
+import re
 import math
-import random
-import lib.libtcodpy as libtcod
+import array
+import heapq
+import rng
+import threading
+import collections
+from lib.backend import libtcod
 import constants as C
 
-def dice(sides):
-    return random.randint(0, sides) == 0
+try:  # numpy backs the layered map if available
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+def dice(sides, stream="ai"):
+    return rng.get(stream).randint(0, sides) == 0
     
-class Dialogue():
+def slot_names(cls):
+    """ the __slots__ names of cls and all its bases """
+    names = []
+    for klass in cls.__mro__:
+        names.extend(klass.__dict__.get("__slots__", ()))
+    return names
+
+class Slotted(object):
+    """
+        Base of the game objects that keep their attributes in __slots__,
+        so thousands of them stay small. Pickling and copying save the
+        slots that are set, with any pickle protocol.
+    """
+    __slots__ = ()
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name))
+                    for name in slot_names(type(self)) if hasattr(self, name))
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class Dialogue(Slotted):
+    __slots__ = ("npc_name", "npc_picture", "dialogue")
+
     def __init__(self, npc_name, npc_picture, dialogue):
         self.npc_name = npc_name
         self.npc_picture = npc_picture
         self.dialogue = dialogue
     
-class ItemBase(object):
+class Positioned(Slotted):
+    """
+        Anything with a map position. Position changes are reported to the
+        ObjectIndex we are in, which keeps its cells up to date.
+    """
+    __slots__ = ("_x", "_y", "object_index")
+
+    def __init__(self):
+        self.object_index = None
+        self._x = 0
+        self._y = 0
+
+    def get_x(self):
+        return self._x
+
+    def set_x(self, x):
+        if self.object_index is not None:
+            self.object_index.moved(self, x, self._y)
+        self._x = x
+
+    def get_y(self):
+        return self._y
+
+    def set_y(self, y):
+        if self.object_index is not None:
+            self.object_index.moved(self, self._x, y)
+        self._y = y
+
+    x = property(get_x, set_x)
+    y = property(get_y, set_y)
+
+    def __getstate__(self):
+        # copies are in no index, until someone adds them to one
+        state = super(Positioned, self).__getstate__()
+        state["object_index"] = None
+        return state
+
+
+class ObjectIndex(list):
+    """
+        The game objects list, with an occupancy index by map cell.
+        Objects added here report every position change, so the
+        at(), blocking_at(), items_at() and in_rect() queries never scan
+        the whole list. version increases each time objects are added
+        or removed.
+    """
+    def __init__(self, objects=()):
+        super(ObjectIndex, self).__init__()
+        self.cells = {}
+        self.version = 0
+        self.extend(objects)
+
+    def append(self, obj):
+        super(ObjectIndex, self).append(obj)
+        self.version += 1
+        obj.object_index = self
+        self.cells.setdefault((obj.x, obj.y), []).append(obj)
+
+    def extend(self, objects):
+        for obj in objects:
+            self.append(obj)
+
+    def remove(self, obj):
+        super(ObjectIndex, self).remove(obj)
+        self.version += 1
+        self.cells[(obj.x, obj.y)].remove(obj)
+        obj.object_index = None
+
+    def moved(self, obj, x, y):
+        """
+            obj is moving from where it is to x, y.
+        """
+        old = self.cells.get((obj.x, obj.y))
+        if old:
+            old.remove(obj)
+            if not old:
+                del self.cells[(obj.x, obj.y)]
+        self.cells.setdefault((x, y), []).append(obj)
+
+    def at(self, x, y):
+        """ objects at x, y """
+        return self.cells.get((x, y), ())
+
+    def blocking_at(self, x, y):
+        """ the first blocking being at x, y, or None """
+        for obj in self.cells.get((x, y), ()):
+            if obj.blocking:
+                return obj
+
+    def items_at(self, x, y):
+        """ items (not beings) at x, y """
+        return [obj for obj in self.cells.get((x, y), ())
+                if not isinstance(obj, AnimalBase)]
+
+    def in_rect(self, left, top, right, bottom):
+        """ objects inside the rectangle, edges included """
+        if (right - left + 1) * (bottom - top + 1) > len(self.cells):
+            return [obj for obj in self
+                    if left <= obj.x <= right and top <= obj.y <= bottom]
+        found = []
+        for x in range(left, right + 1):
+            for y in range(top, bottom + 1):
+                found.extend(self.cells.get((x, y), ()))
+        return found
+
+
+class ItemBase(Positioned):
     """
         Inanimate items (foliage, water, walls) and map tiles.
     """
+    __slots__ = ("char", "name", "fgcolor", "bgcolor", "blocking"
+                ,"seethrough", "seen", "drinkable", "edible", "carryable"
+                ,"fov_limit", "message", "quest_id", "tag")
+
     def __init__(self
                 ,char=" ", name=""
                 ,fgcolor=libtcod.white
                 ,bgcolor=libtcod.darker_green):
+        super(ItemBase, self).__init__()
         self.x = 0
         self.y = 0
         self.char = char
@@ -42,10 +190,668 @@ class ItemBase(object):
         return not self.blocking and not self.drinkable
 
 
-class ActionAI(object):
+class Tile(object):
+    """
+        A map tile prototype (grass, walls, water, foliage).
+        One Tile is shared by every map cell of the same kind, so tiles are
+        read-only. Get them from the TILES registry, never make them directly.
+    """
+    __slots__ = ("index", "char", "name", "fgcolor", "bgcolor", "blocking"
+                ,"seethrough", "drinkable", "fov_limit", "message", "warp")
+
+    def __init__(self, index, char, name, fgcolor, bgcolor, blocking
+                , seethrough, drinkable, fov_limit, message, warp):
+        init = super(Tile, self).__setattr__
+        init("index", index)
+        init("char", char)
+        init("name", name)
+        init("fgcolor", fgcolor)
+        init("bgcolor", bgcolor)
+        init("blocking", blocking)
+        init("seethrough", seethrough)
+        init("drinkable", drinkable)
+        init("fov_limit", fov_limit)
+        init("message", message)
+        init("warp", warp)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("tiles are shared, get another from TILES instead")
+
+    def __reduce__(self):
+        # unpickled and copied tiles come from the registry too
+        return (registered_tile, (self.char, self.name, self.fgcolor
+                , self.bgcolor, self.blocking, self.seethrough
+                , self.drinkable, self.fov_limit, self.message, self.warp))
+
+    def isblank(self):
+        return not self.blocking and not self.drinkable
+
+
+class TileRegistry(object):
+    """
+        Keeps exactly one Tile prototype per kind of tile.
+        get() returns the existing prototype when one matches, maps only
+        store the tile index. New tiles are added under a lock, since the
+        next level may be building on another thread.
+    """
+    def __init__(self):
+        self.tiles = []
+        self.lookup = {}
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def get(self, char=" ", name=""
+            ,fgcolor=libtcod.white, bgcolor=libtcod.darker_green
+            ,blocking=False, seethrough=True, drinkable=False
+            ,fov_limit=None, message=None, warp=False):
+        key = (char, name, tuple(fgcolor), tuple(bgcolor), bool(blocking)
+                , bool(seethrough), bool(drinkable), fov_limit, message
+                , bool(warp))
+        tile = self.lookup.get(key)
+        if tile is None:
+            self.lock.acquire()
+            try:
+                tile = self.lookup.get(key)
+                if tile is None:
+                    tile = Tile(len(self.tiles), char, name, fgcolor, bgcolor
+                            , bool(blocking), bool(seethrough)
+                            , bool(drinkable), fov_limit, message, bool(warp))
+                    self.tiles.append(tile)
+                    self.lookup[key] = tile
+            finally:
+                self.lock.release()
+        return tile
+
+    def __getitem__(self, index):
+        return self.tiles[index]
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def table(self, attribute):
+        """
+            Return a numpy lookup table of attribute, indexed by tile index.
+            Colours give an (n, 3) table, chars give their ascii codes.
+        """
+        cached = self.tables.get(attribute)
+        if cached is not None and len(cached) == len(self.tiles):
+            return cached
+        values = [getattr(t, attribute) for t in self.tiles]
+        if attribute in ("fgcolor", "bgcolor"):
+            table = numpy.array([tuple(v) for v in values], dtype=numpy.uint8)
+        elif attribute == "char":
+            table = numpy.array([ord(v) for v in values], dtype=numpy.int32)
+        elif attribute == "fov_limit":
+            table = numpy.array([v or 0 for v in values], dtype=numpy.int8)
+        else:
+            table = numpy.array(values, dtype=bool)
+        self.tables[attribute] = table
+        return table
+
+# the one registry every map shares, it only grows by new kinds of tiles
+TILES = TileRegistry()
+
+def registered_tile(*args):
+    """ TILES.get() as a function, for unpickling tiles """
+    return TILES.get(*args)
+
+
+class TileColumn(object):
+    """
+        One map column, so game_map[x][y] reads (and writes) tiles the
+        same as the old list-of-lists map did.
+    """
+    __slots__ = ("game_map", "x")
+
+    def __init__(self, game_map, x):
+        self.game_map = game_map
+        self.x = x
+
+    def __getitem__(self, y):
+        return self.game_map.tile(self.x, y)
+
+    def __setitem__(self, y, tile):
+        self.game_map.set_tile(self.x, y, tile)
+
+    def __len__(self):
+        return self.game_map.height
+
+
+class TileMap(object):
+    """
+        The level map: a grid of TILES indices, indexed [x][y].
+        Per-cell state that changes during play (seen) lives here too,
+        since the tiles themselves are shared.
+        revision increases each time a tile changes.
+    """
+    def __init__(self, width, height, tile):
+        self.width = width
+        self.height = height
+        self.registry = TILES
+        self.revision = 0
+        self.cells = [array.array("H", [tile.index]) * height
+                        for x in range(width)]
+        self.seen = [bytearray(height) for x in range(width)]
+        self.blank = {}
+        self.blank_revision = -1
+
+    def __getstate__(self):
+        # indices differ from run to run, so keep the tiles they stand for
+        state = self.__dict__.copy()
+        del state["registry"]
+        state["blank"] = {}
+        state["blank_revision"] = -1
+        state["tiles"] = dict((index, self.registry.tiles[index])
+                                for index in self.indices())
+        return state
+
+    def __setstate__(self, state):
+        tiles = state.pop("tiles")
+        self.__dict__.update(state)
+        self.registry = TILES
+        self.renumber(dict((index, tile.index)
+                            for index, tile in tiles.items()))
+
+    def indices(self):
+        """ the set of tile indices used on the map """
+        return set(index for column in self.cells for index in column)
+
+    def renumber(self, table):
+        """ swap every tile index for table[index] """
+        self.cells = [array.array("H", [table[index] for index in column])
+                        for column in self.cells]
+
+    def __getitem__(self, x):
+        return TileColumn(self, x)
+
+    def __len__(self):
+        return self.width
+
+    def tile(self, x, y):
+        """ the Tile at x, y """
+        return self.registry.tiles[self.cells[x][y]]
+
+    def set_tile(self, x, y, tile):
+        self.cells[x][y] = tile.index
+        self.revision += 1
+
+    def flip(self, mirror_x, mirror_y):
+        """
+            Mirror the map on X and/or Y.
+        """
+        if mirror_x:
+            self.cells.reverse()
+            self.seen.reverse()
+        if mirror_y:
+            for column in self.cells:
+                column.reverse()
+            for column in self.seen:
+                column.reverse()
+        self.revision += 1
+
+    def closed_cells(self):
+        """
+            Yield (x, y, seethrough, walkable) for each cell that is not
+            both seethrough and walkable. Walkable excludes water.
+        """
+        tiles = self.registry.tiles
+        for x in range(self.width):
+            column = self.cells[x]
+            for y in range(self.height):
+                tile = tiles[column[y]]
+                walkable = not tile.blocking and not tile.drinkable
+                if not tile.seethrough or not walkable:
+                    yield (x, y, tile.seethrough, walkable)
+
+    def blank_cells(self, margin=0):
+        """
+            The (x, y) of every blank cell, at least margin cells in from
+            the map edges. Kept until the map changes.
+        """
+        if self.blank_revision != self.revision:
+            self.blank = {}
+            self.blank_revision = self.revision
+        cells = self.blank.get(margin)
+        if cells is None:
+            cells = self.find_blank(margin)
+            self.blank[margin] = cells
+        return cells
+
+    def find_blank(self, margin):
+        tiles = self.registry.tiles
+        return [(x, y) for x in range(margin, self.width - margin)
+                        for y in range(margin, self.height - margin)
+                        if tiles[self.cells[x][y]].isblank()]
+
+    def visible(self, fov_map, x, y, radius):
+        """
+            Return a [x][y] mask of the cells in fov_map's field of view,
+            computed from x, y with radius. Only cells within radius are
+            probed, nothing further away can be in view.
+        """
+        mask = [bytearray(self.height) for mx in range(self.width)]
+        for mx in range(max(0, x - radius), min(self.width, x + radius + 1)):
+            column = mask[mx]
+            for my in range(max(0, y - radius), min(self.height, y + radius + 1)):
+                if libtcod.map_is_in_fov(fov_map, mx, my):
+                    column[my] = 1
+        return mask
+
+    def line_of_sight(self, x, y, tx, ty, radius):
+        """
+            Return True if tx, ty can be seen from x, y within radius.
+            The line is walked both ways and either clear line will do,
+            so if A sees B then B sees A.
+        """
+        dx = tx - x
+        dy = ty - y
+        if dx * dx + dy * dy > radius * radius:
+            return False
+        steps = max(abs(dx), abs(dy))
+        if steps < 2:
+            return True
+        tiles = self.registry.tiles
+        for ox, oy, sx, sy in ((x, y, dx, dy), (tx, ty, -dx, -dy)):
+            for k in range(1, steps):
+                cx = ox + (2 * k * sx + steps) // (2 * steps)
+                cy = oy + (2 * k * sy + steps) // (2 * steps)
+                if not tiles[self.cells[cx][cy]].seethrough:
+                    break
+            else:
+                return True
+        return False
+
+    def lines_of_sight(self, viewers, tx, ty):
+        """
+            Return for each (x, y, radius) in viewers if it sees tx, ty.
+        """
+        return [self.line_of_sight(x, y, tx, ty, radius)
+                for x, y, radius in viewers]
+
+    def everything(self):
+        """ a mask with every cell in view """
+        return [bytearray(b"\x01" * self.height) for x in range(self.width)]
+
+    def update_seen(self, mask):
+        """ remember every cell in mask as seen """
+        for x in range(self.width):
+            seen = self.seen[x]
+            column = mask[x]
+            for y in range(self.height):
+                if column[y]:
+                    seen[y] = 1
+
+    def drawable(self, mask):
+        """
+            Yield (x, y, tile, in_view) for every cell that is in view of
+            mask, or was seen before.
+        """
+        tiles = self.registry.tiles
+        for x in range(self.width):
+            cells = self.cells[x]
+            seen = self.seen[x]
+            column = mask[x]
+            for y in range(self.height):
+                if seen[y]:
+                    yield (x, y, tiles[cells[y]], column[y])
+
+
+class ArrayTileMap(TileMap):
+    """
+        A TileMap stored as numpy arrays.
+        layer(name) returns a 2D array of any tile attribute (blocking,
+        seethrough, drinkable, fov_limit, char, fgcolor, bgcolor), so hot
+        code can work on the whole map at once.
+    """
+    def __init__(self, width, height, tile):
+        self.width = width
+        self.height = height
+        self.registry = TILES
+        self.revision = 0
+        self.cells = numpy.empty((width, height), dtype=numpy.uint16)
+        self.cells.fill(tile.index)
+        self.seen = numpy.zeros((width, height), dtype=bool)
+        self.layers = {}
+        self.layers_revision = -1
+        self.blank = {}
+        self.blank_revision = -1
+
+    def __getstate__(self):
+        state = super(ArrayTileMap, self).__getstate__()
+        state["layers"] = {}
+        state["layers_revision"] = -1
+        return state
+
+    def indices(self):
+        return set(int(index) for index in numpy.unique(self.cells))
+
+    def renumber(self, table):
+        lookup = numpy.zeros(max(table) + 1, dtype=numpy.uint16)
+        for index, new_index in table.items():
+            lookup[index] = new_index
+        self.cells = lookup[self.cells]
+
+    def tile(self, x, y):
+        return self.registry.tiles[self.cells[x, y]]
+
+    def set_tile(self, x, y, tile):
+        self.cells[x, y] = tile.index
+        self.revision += 1
+
+    def flip(self, mirror_x, mirror_y):
+        if mirror_x:
+            self.cells = numpy.ascontiguousarray(self.cells[::-1, :])
+            self.seen = numpy.ascontiguousarray(self.seen[::-1, :])
+        if mirror_y:
+            self.cells = numpy.ascontiguousarray(self.cells[:, ::-1])
+            self.seen = numpy.ascontiguousarray(self.seen[:, ::-1])
+        self.revision += 1
+
+    def layer(self, attribute):
+        """
+            Return the [x, y] array of attribute for every cell.
+        """
+        if self.layers_revision != self.revision:
+            self.layers = {}
+            self.layers_revision = self.revision
+        if not attribute in self.layers:
+            self.layers[attribute] = self.registry.table(attribute)[self.cells]
+        return self.layers[attribute]
+
+    def walkable(self):
+        return ~(self.layer("blocking") | self.layer("drinkable"))
+
+    def find_blank(self, margin):
+        xs, ys = numpy.nonzero(self.walkable()[margin:self.width - margin
+                                            , margin:self.height - margin])
+        return zip((xs + margin).tolist(), (ys + margin).tolist())
+
+    def closed_cells(self):
+        seethrough = self.layer("seethrough")
+        walkable = self.walkable()
+        xs, ys = numpy.nonzero(~(seethrough & walkable))
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            yield (x, y, bool(seethrough[x, y]), bool(walkable[x, y]))
+
+    def visible(self, fov_map, x, y, radius):
+        mask = numpy.zeros((self.width, self.height), dtype=bool)
+        for mx in range(max(0, x - radius), min(self.width, x + radius + 1)):
+            for my in range(max(0, y - radius), min(self.height, y + radius + 1)):
+                if libtcod.map_is_in_fov(fov_map, mx, my):
+                    mask[mx, my] = True
+        return mask
+
+    def lines_of_sight(self, viewers, tx, ty):
+        if not viewers:
+            return []
+        x, y, radius = [numpy.array(e, dtype=numpy.int32)
+                            for e in zip(*viewers)]
+        dx = tx - x
+        dy = ty - y
+        in_range = dx * dx + dy * dy <= radius * radius
+        steps = numpy.maximum(numpy.abs(dx), numpy.abs(dy))
+        longest = int(steps.max())
+        if longest < 2:
+            return in_range.tolist()
+        seethrough = self.layer("seethrough")
+        k = numpy.arange(1, longest)[numpy.newaxis, :]
+        n = numpy.maximum(steps, 1)[:, numpy.newaxis]
+        on_line = k < n
+        clear = numpy.zeros(len(viewers), dtype=bool)
+        target_x = numpy.full_like(x, tx)
+        target_y = numpy.full_like(y, ty)
+        for ox, oy, sx, sy in ((x, y, dx, dy), (target_x, target_y, -dx, -dy)):
+            cx = ox[:, numpy.newaxis] + (2 * k * sx[:, numpy.newaxis] + n) // (2 * n)
+            cy = oy[:, numpy.newaxis] + (2 * k * sy[:, numpy.newaxis] + n) // (2 * n)
+            cx = numpy.clip(cx, 0, self.width - 1)
+            cy = numpy.clip(cy, 0, self.height - 1)
+            clear |= numpy.all(seethrough[cx, cy] | ~on_line, axis=1)
+        return (in_range & clear).tolist()
+
+    def everything(self):
+        return numpy.ones((self.width, self.height), dtype=bool)
+
+    def update_seen(self, mask):
+        self.seen |= mask
+
+    def drawable(self, mask):
+        tiles = self.registry.tiles
+        xs, ys = numpy.nonzero(self.seen)
+        cells = self.cells[xs, ys].tolist()
+        lit = mask[xs, ys].tolist()
+        for x, y, index, in_view in zip(xs.tolist(), ys.tolist(), cells, lit):
+            yield (x, y, tiles[index], in_view)
+
+
+class FovView(object):
+    """
+        One viewer's own field of view, computed on its own fov_map.
+        update() only recomputes when the viewer moved or its radius
+        changed, in_view() and mask read the last result.
+    """
+    def __init__(self, game_map, fov_map):
+        self.game_map = game_map
+        self.fov_map = fov_map
+        self.origin = None
+        self.mask = None
+
+    def update(self, x, y, radius):
+        """
+            Recompute the view from x, y if needed. Return True if we did.
+        """
+        if self.origin == (x, y, radius):
+            return False
+        libtcod.map_compute_fov(self.fov_map, x, y, radius
+                                ,C.FOV_LIGHT_WALLS, C.FOV_ALGO)
+        self.mask = self.game_map.visible(self.fov_map, x, y, radius)
+        self.origin = (x, y, radius)
+        return True
+
+    def in_view(self, x, y):
+        return self.mask[x][y]
+
+
+class ChaseMap(object):
+    """
+        Distance to the player from every map cell, from one dijkstra flood.
+        Any number of chasers walk downhill with step_from(), so following
+        the player costs one flood per turn, not one path per NPC.
+        Every step costs 1, diagonals too, so distances count moves.
+    """
+    NEIGHBOURS = ((-1, -1), (0, -1), (1, -1), (-1, 0)
+                , (1, 0), (-1, 1), (0, 1), (1, 1))
+    # of equal steps, prefer the straightest at (1) or away from (-1) the root
+    BEARING = 1
+
+    def __init__(self, fov_map):
+        self.dijkstra = libtcod.dijkstra_new(fov_map, 1.0)
+        self.root = None
+        self.computed = None
+
+    def update(self, x, y):
+        """
+            Root the map at x, y. The flood waits until someone asks.
+        """
+        self.root = (x, y)
+
+    def distance(self, x, y):
+        """
+            Moves from x, y to the root, None if it can't be reached.
+        """
+        if self.computed != self.root:
+            libtcod.dijkstra_compute(self.dijkstra, self.root[0], self.root[1])
+            self.computed = self.root
+        distance = libtcod.dijkstra_get_distance(self.dijkstra, x, y)
+        if distance < 0:
+            return None
+        return distance
+
+    def distances(self):
+        """
+            The [x][y] moves of every map cell to the root, -1 where it
+            can't be reached.
+        """
+        self.distance(*self.root)
+        get_distance = libtcod.dijkstra_get_distance
+        return [[get_distance(self.dijkstra, x, y)
+                for y in range(C.MAP_HEIGHT)] for x in range(C.MAP_WIDTH)]
+
+    def step_from(self, x, y):
+        """
+            Return the (x, y) offset one move downhill, or None.
+            Of equal moves we take the one straightest at the root.
+        """
+        here = self.distance(x, y)
+        if here is None:
+            return None
+        rx, ry = self.root
+        best = None
+        for dx, dy in ChaseMap.NEIGHBOURS:
+            nx = x + dx
+            ny = y + dy
+            if nx < 0 or nx >= C.MAP_WIDTH or ny < 0 or ny >= C.MAP_HEIGHT:
+                continue
+            distance = self.distance(nx, ny)
+            if distance is None or distance >= here:
+                continue
+            rank = (distance, self.BEARING * ((rx - nx) ** 2 + (ry - ny) ** 2))
+            if best is None or rank < best[0]:
+                best = (rank, (dx, dy))
+        if best:
+            return best[1]
+
+    def close(self):
+        libtcod.dijkstra_delete(self.dijkstra)
+
+
+class FleeMap(ChaseMap):
+    """
+        Where to run from the player, shared by all SKITTISH NPCs.
+        The chase_map distances are scaled by SCALE and relaxed again, so
+        walking downhill leads away from the player and around walls,
+        rather than into the nearest corner. Relaxed when someone first
+        asks after the player moved, the last FIELDS of them are kept by
+        root, so pacing about doesn't relax them again.
+    """
+    SCALE = -1.2
+    BEARING = -1
+    FIELDS = 16
+
+    def __init__(self, chase_map, game_map):
+        self.chase_map = chase_map
+        self.computed = None
+        self.values = {}
+        self.fields = {}
+        self.order = []
+        closed = set((x, y) for x, y, seethrough, walkable
+                        in game_map.closed_cells() if not walkable)
+        self.walkable = [(x, y) for x in range(C.MAP_WIDTH)
+                        for y in range(C.MAP_HEIGHT) if not (x, y) in closed]
+
+    @property
+    def root(self):
+        return self.chase_map.root
+
+    def update(self, x, y):
+        self.chase_map.update(x, y)
+
+    def refresh(self):
+        """ the values rooted at the player, relaxed if not kept """
+        if self.computed == self.root:
+            return
+        root = self.root
+        values = self.fields.get(root)
+        if values is None:
+            values = self.relax()
+            self.fields[root] = values
+        else:
+            self.order.remove(root)
+        self.order.append(root)
+        while len(self.order) > self.FIELDS:
+            del self.fields[self.order.pop(0)]
+        self.values = values
+        self.computed = root
+
+    def distance(self, x, y):
+        self.refresh()
+        return self.values.get((x, y))
+
+    def relax(self):
+        """
+            Scale the chase distances and let them settle, each cell ends
+            up at most 1 more than its lowest neighbour. Returns the values
+            by (x, y).
+        """
+        values = {}
+        for x, y in self.walkable:
+            distance = self.chase_map.distance(x, y)
+            if distance is not None:
+                values[(x, y)] = distance * self.SCALE
+        heap = [(value, cell) for cell, value in values.items()]
+        heapq.heapify(heap)
+        while heap:
+            value, (x, y) = heapq.heappop(heap)
+            if value > values[(x, y)]:
+                continue
+            for dx, dy in ChaseMap.NEIGHBOURS:
+                cell = (x + dx, y + dy)
+                if cell in values and value + 1 < values[cell]:
+                    values[cell] = value + 1
+                    heapq.heappush(heap, (value + 1, cell))
+        return values
+
+    def close(self):
+        self.values = {}
+        self.fields = {}
+        self.order = []
+        self.computed = None
+
+
+class ArrayFleeMap(FleeMap):
+    """
+        A FleeMap relaxed over numpy arrays: every cell takes the lowest
+        of its neighbours plus 1, all at once, until none changes. Settles
+        on the same values the heap does.
+    """
+    def __init__(self, chase_map, game_map):
+        super(ArrayFleeMap, self).__init__(chase_map, game_map)
+        self.walkable = game_map.walkable()
+
+    def distance(self, x, y):
+        self.refresh()
+        value = self.values[x, y]
+        if value == numpy.inf:
+            return None
+        return float(value)
+
+    def relax(self):
+        distances = numpy.array(self.chase_map.distances(), dtype=float)
+        reachable = self.walkable & (distances >= 0)
+        values = numpy.where(reachable, distances * self.SCALE, numpy.inf)
+        width, height = values.shape
+        padded = numpy.empty((width + 2, height + 2))
+        padded.fill(numpy.inf)
+        while True:
+            padded[1:-1, 1:-1] = values
+            lowest = numpy.empty_like(values)
+            lowest.fill(numpy.inf)
+            for dx, dy in ChaseMap.NEIGHBOURS:
+                numpy.minimum(lowest, padded[1 + dx:1 + dx + width
+                                            , 1 + dy:1 + dy + height]
+                                , lowest)
+            relaxed = numpy.where(reachable
+                                , numpy.minimum(values, lowest + 1), numpy.inf)
+            if (relaxed == values).all():
+                return values
+            values = relaxed
+
+
+class ActionAI(Slotted):
     """
         Handles interaction with other beings.
     """
+    __slots__ = ("owner", "hostile", "dialogue_text", "attack_rating")
+
     def __init__(self, owner):
         self.owner = owner
         self.hostile = False
@@ -92,6 +898,8 @@ class ActionManual(ActionAI):
     """
         The Action attribute for the player
     """
+    __slots__ = ()
+
     def __init__(self, owner):
         self.owner = owner
 
@@ -124,7 +932,7 @@ class ActionManual(ActionAI):
             player.msg("*sniffs* %s" % (target.name))
             
 
-class MoveAI(object):
+class MoveAI(Slotted):
     """
         Handles NPC movement.
         SKITTISH: keeps its distance
@@ -137,6 +945,8 @@ class MoveAI(object):
     FRIENDLY = 0x2
     HUNTING = 0x3
 
+    __slots__ = ("owner", "behaviour", "erraticity", "prey_x", "prey_y")
+
     def __init__(self, owner):
         self.owner = owner
         self.behaviour = None
@@ -144,64 +954,84 @@ class MoveAI(object):
         self.prey_x = 0
         self.prey_y = 0
 
-    def take_turn(self, game_map, fov_map, path_map, game_objects, playerxy):
+    def take_turn(self, game_map, path_map, chase_map, flee_map, game_objects
+                , playerxy, sees_player=None):
+        """
+            Move the npc. chase_map and flee_map are the ChaseMap and
+            FleeMap rooted at the player.
+            sees_player tells if the player is in sight, if None we look
+            for ourselves.
+        """
         npc = self.owner
+        if sees_player is None:
+            x, y = playerxy
+            sees_player = game_map.line_of_sight(npc.x, npc.y, x, y
+                                                , npc.fov_radius)
         x, y = (0, 0)
         if self.behaviour == MoveAI.SKITTISH:
             if dice(2):
-                npc.move(game_map, game_objects, random.randint(-1, 1), random.randint(-1, 1))
-            else:
-                x, y = playerxy
-                libtcod.map_compute_fov(fov_map, npc.x, npc.y, npc.fov_radius
-                                                ,C.FOV_LIGHT_WALLS, C.FOV_ALGO)
-                if libtcod.map_is_in_fov(fov_map, x, y):
-                    # player in sight!
-                    if libtcod.path_compute(path_map, npc.x, npc.y, x, y):
-                        x, y = libtcod.path_walk(path_map, True)
-                        if not x is None:
-                            npc.move(game_map, game_objects, npc.x - x, npc.y - y)
+                npc.move(game_map, game_objects, rng.get("ai").randint(-1, 1), rng.get("ai").randint(-1, 1))
+            elif sees_player:
+                self.flee(game_map, game_objects, flee_map)
         elif self.behaviour == MoveAI.NEUTRAL:
             if dice(self.erraticity):
-                x = random.randint(-1, 1)
+                x = rng.get("ai").randint(-1, 1)
             if dice(self.erraticity):
-                y = random.randint(-1, 1)
+                y = rng.get("ai").randint(-1, 1)
             npc.move(game_map, game_objects, x, y)
         elif self.behaviour == MoveAI.FRIENDLY:
-            x, y = playerxy
-            # player in sight!
-            if libtcod.path_compute(path_map, npc.x, npc.y, x, y):
-                # stick a little bit away
-                if libtcod.path_size(path_map) > 3:
-                    x, y = libtcod.path_walk(path_map, True)
-                    if not x is None:
-                        npc.move(game_map, game_objects, x - npc.x, y - npc.y)
+            self.follow(game_map, game_objects, chase_map)
         elif self.behaviour == MoveAI.HUNTING:
-            # look for prey
-            x, y = playerxy
-            libtcod.map_compute_fov(fov_map, npc.x, npc.y, npc.fov_radius
-                                            ,C.FOV_LIGHT_WALLS, C.FOV_ALGO)
-            if libtcod.map_is_in_fov(fov_map, x, y):
-                # player in sight!
-                if libtcod.path_compute(path_map, npc.x, npc.y, x, y):
-                    self.prey_x = x
-                    self.prey_y = y
-                    x, y = libtcod.path_walk(path_map, True)
-                    if not x is None:
-                        npc.move(game_map, game_objects, x - npc.x, y - npc.y)
-            else:
-                # prowl last know prey location
-                if libtcod.path_compute(path_map, npc.x, npc.y
-                                        ,self.prey_x, self.prey_y):
-                    x, y = libtcod.path_walk(path_map, True)
-                    if not x is None:
-                        npc.move(game_map, game_objects, x - npc.x, y - npc.y)
+            self.hunt(game_map, path_map, chase_map, game_objects, playerxy
+                    , sees_player)
+
+    def flee(self, game_map, game_objects, flee_map):
+        """ player in sight! run """
+        npc = self.owner
+        step = flee_map.step_from(npc.x, npc.y)
+        if step:
+            npc.move(game_map, game_objects, step[0], step[1])
+
+    def follow(self, game_map, game_objects, chase_map):
+        npc = self.owner
+        distance = chase_map.distance(npc.x, npc.y)
+        # stick a little bit away
+        if distance is not None and distance > 3:
+            step = chase_map.step_from(npc.x, npc.y)
+            if step:
+                npc.move(game_map, game_objects, step[0], step[1])
+
+    def hunt(self, game_map, path_map, chase_map, game_objects, playerxy
+            , sees_player):
+        # look for prey
+        npc = self.owner
+        x, y = playerxy
+        if sees_player:
+            # player in sight!
+            step = chase_map.step_from(npc.x, npc.y)
+            if step:
+                self.prey_x = x
+                self.prey_y = y
+                npc.move(game_map, game_objects, step[0], step[1])
+        else:
+            # prowl last know prey location
+            if libtcod.path_compute(path_map, npc.x, npc.y
+                                    ,self.prey_x, self.prey_y):
+                x, y = libtcod.path_walk(path_map, True)
+                if not x is None:
+                    npc.move(game_map, game_objects, x - npc.x, y - npc.y)
 
 
-class QuestAI(object):
+class QuestAI(Slotted):
     """
         Quest AI for NPC's.
     """
-    def __init__(self, quest_id=os.urandom(4)):
+    __slots__ = ("quest_id", "owner", "item", "title", "success_dialogue"
+                ,"success_command")
+
+    def __init__(self, quest_id=None):
+        if quest_id is None:
+            quest_id = "%08x" % (rng.get("spawn").getrandbits(32))
         self.quest_id = quest_id
         self.owner = None
         self.item = None
@@ -258,21 +1088,29 @@ class QuestAI(object):
                     # give the player a quest
                     player.give_quest(QuestData(self.quest_id, npc.name, self.title))
 
-class QuestData(object):
+class QuestData(Slotted):
     """
         quest data conainer kept by player.quests[]
     """
+    __slots__ = ("quest_id", "npc_name", "title")
+
     def __init__(self, quest_id, npc_name=None, title=None):
         self.quest_id = quest_id
         self.npc_name = npc_name
         self.title = title    
 
 
-class AnimalBase(object):
+class AnimalBase(Positioned):
     """
         Living things (NPC's) and the Player.
     """
+    __slots__ = ("hp", "char", "name", "fgcolor", "seen", "blocking"
+                ,"see_message", "moves", "move_step", "carryable", "carrying"
+                ,"fov_radius", "move_ai", "action_ai", "quest_ai", "quest"
+                ,"flying", "picture", "tag")
+
     def __init__(self):
+        super(AnimalBase, self).__init__()
         self.x = 0
         self.y = 0
         self.hp = 100
@@ -318,22 +1156,20 @@ class AnimalBase(object):
         y = self.y + yoffset
         # test if within the map bounds, and no tiles block us
         if x >= 0 and x < C.MAP_WIDTH and y >= 0 and y < C.MAP_HEIGHT:
-            tile = game_map[x][y]
+            tile = game_map.tile(x, y)
             # cant move into a drinkable tile if already on one
             near_deep_water = tile.drinkable and \
-                                            game_map[self.x][self.y].drinkable
+                                        game_map.tile(self.x, self.y).drinkable
             if not tile.blocking and not near_deep_water or self.flying:
                 # test if moving against another being
-                blocking_us = False
-                for being in game_objects:
-                    if being.x == x and being.y == y and being.blocking:
-                        blocking_us = True
-                        if self.action_ai:
-                            self.action_ai.interact_with(being, game_objects)
-                        if self.quest_ai:
-                            self.quest_ai.interact_with(being, game_objects)
-                        return True
-                if not blocking_us:
+                being = game_objects.blocking_at(x, y)
+                if being:
+                    if self.action_ai:
+                        self.action_ai.interact_with(being, game_objects)
+                    if self.quest_ai:
+                        self.quest_ai.interact_with(being, game_objects)
+                    return True
+                else:
                     self.moves = self.moves + 1
                     # but if we are little slow, we may need to way for next
                     # turn to move :p
@@ -359,6 +1195,11 @@ class Player(AnimalBase):
     """
         Tracks the player state and provides helper functions
     """
+    __slots__ = ("weak", "thirsty", "hungry", "mustpiddle", "quenches"
+                ,"level", "score", "message_trim_idx", "messages", "wizard"
+                ,"dialogues", "quests", "piddles_taken", "bites_taken"
+                ,"treats_eaten", "entryxy")
+
     def __init__(self):
         super(Player, self).__init__()
         self.x = 1
@@ -383,6 +1224,7 @@ class Player(AnimalBase):
         self.piddles_taken = 0
         self.bites_taken = 0
         self.treats_eaten = 0
+        self.entryxy = (self.x, self.y)
 
     def addscore(self, value):
         self.score = self.score + 10
@@ -414,7 +1256,7 @@ class Player(AnimalBase):
                     self.hp = 100
                 self.carrying = None
                 self.treats_eaten = self.treats_eaten + 1
-                self.msg(random.choice(("Yum!", "*munch munch*", "*gulp*", "*chomp chomp*")))
+                self.msg(rng.get("flavour").choice(("Yum!", "*munch munch*", "*gulp*", "*chomp chomp*")))
                 if self.weak:
                     self.weak = False
                     self.msg("You don't feel weak anymore.")
@@ -471,8 +1313,8 @@ class Player(AnimalBase):
         return int(self.hp / 10.0)
         
     def pickup_item(self, objects):
-        for obj in objects:
-            if obj.x == self.x and obj.y == self.y and obj.carryable:
+        for obj in objects.items_at(self.x, self.y):
+            if obj.carryable:
                 self.give_item(obj)
                 break
     
@@ -489,9 +1331,9 @@ class Player(AnimalBase):
                 if self.thirsty:
                     self.weak = True
                 self.thirsty = True
-            tile = game_map[x][y]
+            tile = game_map.tile(self.x, self.y)
             if self.weak:
-                if dice(C.PLAYER_WEAK_HP_DICE):
+                if dice(C.PLAYER_WEAK_HP_DICE, "player"):
                     self.hp = self.hp - 1
             if tile.message:
                 self.msg(tile.message)
@@ -502,7 +1344,7 @@ class Player(AnimalBase):
             return True
 
     def can_warp(self, game_map):
-        return isinstance(game_map[self.x][self.y], Hole)
+        return game_map.tile(self.x, self.y).warp
     
     def warp_prep(self):
         # don't shift progression for death states
@@ -524,7 +1366,7 @@ class Player(AnimalBase):
         # reset quests each level
         self.quests = []
         if self.level > 1:
-            self.messages = [random.choice(( 
+            self.messages = [rng.get("flavour").choice(( 
                 "You crawl through the fence..." \
                 ,"You smell biscuits..." \
                 ,"You enter this yard..." \
@@ -555,10 +1397,10 @@ class Player(AnimalBase):
     def quench_thirst(self, game_map):
         messages = ("%c*laps water*%c, woof!", "%c*lap*lap*gulp*%c"
                     , "%c*lap*lap*lap*%c")
-        if game_map[self.x][self.y].drinkable:
+        if game_map.tile(self.x, self.y).drinkable:
             self.quenches = self.quenches + 1
             self.thirsty = False
-            self.msg(random.choice(messages) % (C.COL5, C.COLS))
+            self.msg(rng.get("flavour").choice(messages) % (C.COL5, C.COLS))
             if self.quenches % C.PLAYER_PIDDLE_INDEX == 0:
                 self.mustpiddle = True
 
@@ -567,8 +1409,8 @@ class Player(AnimalBase):
             # find something interesting to go against
             surrounding = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 0), (0, 1), (1, -1), (1, 0), (1, 1))
             for i in range(10):
-                spot = random.choice(surrounding)
-                tile = game_map[self.x + spot[0]][self.y + spot[1]]
+                spot = rng.get("player").choice(surrounding)
+                tile = game_map.tile(self.x + spot[0], self.y + spot[1])
                 if not tile.isblank():
                     # relief!
                     self.msg("You *piddle* on the %s, yey!" % (tile.name))
@@ -582,6 +1424,39 @@ class Player(AnimalBase):
                 self.mustpiddle = False
 
 
+class EntityStore(object):
+    """
+        The npcs of a level, and their turns. take_turns() moves every npc
+        once, one after the other. The npcs are found again when objects
+        come or go.
+    """
+    def __init__(self, game_objects):
+        self.game_objects = game_objects
+        self.version = None
+        self.npcs = []
+
+    def refresh(self):
+        if self.version != self.game_objects.version:
+            self.version = self.game_objects.version
+            self.npcs = [e for e in self.game_objects
+                        if isinstance(e, AnimalBase) and e.move_ai]
+
+    def take_turns(self, game_map, path_map, chase_map, flee_map, player):
+        """
+            Move the npcs. chase_map and flee_map are rooted at the player,
+            who stays put while they move.
+        """
+        self.refresh()
+        # find who sees the player in one go
+        sightings = game_map.lines_of_sight(
+                    [(npc.x, npc.y, npc.fov_radius) for npc in self.npcs]
+                    ,player.x, player.y)
+        for npc, sees_player in zip(self.npcs, sightings):
+            npc.move_ai.take_turn(game_map, path_map, chase_map, flee_map
+                                ,self.game_objects, (player.x, player.y)
+                                ,sees_player)
+
+
 class GameState():
     """
         Handles game state via a stack based finite machine.
@@ -606,39 +1481,375 @@ class GameState():
     def is_empty(self):
         return len(self.stack) == 0
 
-class Hole(ItemBase):
+class Renderer(object):
+    """
+        Draws onto a console through a back and a front buffer.
+        Each frame draws every cell into the back buffer with put(), and
+        present() only sends the console the cells that differ from the
+        last frame. Cells nobody put() are blank.
+        When more than BULK cells changed, the whole console is uploaded
+        with three console_fill calls instead.
+    """
+    BULK = 400
+
+    def __init__(self, console, width, height):
+        self.console = console
+        self.width = width
+        self.height = height
+        self.blank = (" ", libtcod.white, libtcod.black)
+        # None is never equal to a cell, so the first present draws all
+        self.front = [None] * (width * height)
+        self.back = [self.blank] * (width * height)
+        self.pushed = 0
+
+    def clear(self):
+        """ start a new frame """
+        self.back = [self.blank] * (self.width * self.height)
+
+    def put(self, x, y, char, fgcolor, bgcolor):
+        self.back[y * self.width + x] = (char, fgcolor, bgcolor)
+
+    def put_map(self, game_map, in_view):
+        """
+            Put every seen map cell, the ones out of view are dimmed.
+        """
+        for x, y, tile, lit in game_map.drawable(in_view):
+            if lit:
+                self.put(x, y, tile.char, tile.fgcolor, tile.bgcolor)
+            else:
+                self.put(x, y, tile.char, libtcod.black, libtcod.darkest_grey)
+
+    def present(self):
+        """
+            Send changed cells to the console, return how many.
+            Colours compare by identity, they are shared constants.
+        """
+        front = self.front
+        changed = []
+        for i, cell in enumerate(self.back):
+            last = front[i]
+            if last is None or cell[0] != last[0] or cell[1] is not last[1] \
+                    or cell[2] is not last[2]:
+                changed.append(i)
+        if len(changed) > self.BULK:
+            self.fill()
+        else:
+            width = self.width
+            for i in changed:
+                cell = self.back[i]
+                libtcod.console_put_char_ex(self.console, i % width
+                                        , i // width, cell[0], cell[1], cell[2])
+                front[i] = cell
+        self.pushed = len(changed)
+        return self.pushed
+
+    def fill(self):
+        """
+            Upload the whole back buffer in one go.
+        """
+        chars = []
+        fr, fg, fb = [], [], []
+        br, bg, bb = [], [], []
+        for char, fgcolor, bgcolor in self.back:
+            if isinstance(char, str):
+                char = ord(char)
+            chars.append(char)
+            fr.append(fgcolor.r)
+            fg.append(fgcolor.g)
+            fb.append(fgcolor.b)
+            br.append(bgcolor.r)
+            bg.append(bgcolor.g)
+            bb.append(bgcolor.b)
+        libtcod.console_fill_char(self.console, chars)
+        libtcod.console_fill_foreground(self.console, fr, fg, fb)
+        libtcod.console_fill_background(self.console, br, bg, bb)
+        self.front = list(self.back)
+
+    def invalidate(self):
+        """ redraw every cell on the next present """
+        self.front = [None] * (self.width * self.height)
+
+
+class BulkRenderer(Renderer):
+    """
+        A Renderer with numpy buffers, indexed [y, x] like the console.
+        put_map() draws the whole map, fog of war included, with array
+        operations. present() uploads the console with three console_fill
+        calls, or skips it when nothing changed.
+    """
+    def __init__(self, console, width, height):
+        self.console = console
+        self.width = width
+        self.height = height
+        self.chars = numpy.zeros((height, width), dtype=numpy.int32)
+        self.fg = numpy.zeros((height, width, 3), dtype=numpy.uint8)
+        self.bg = numpy.zeros((height, width, 3), dtype=numpy.uint8)
+        self.front = None
+        self.pushed = 0
+        self.clear()
+
+    def clear(self):
+        self.chars.fill(ord(" "))
+        self.fg[:] = tuple(libtcod.white)
+        self.bg[:] = tuple(libtcod.black)
+
+    def put(self, x, y, char, fgcolor, bgcolor):
+        if isinstance(char, str):
+            char = ord(char)
+        self.chars[y, x] = char
+        self.fg[y, x] = tuple(fgcolor)
+        self.bg[y, x] = tuple(bgcolor)
+
+    def put_map(self, game_map, in_view):
+        if not isinstance(game_map, ArrayTileMap):
+            return super(BulkRenderer, self).put_map(game_map, in_view)
+        # the map is [x, y], the console [y, x]
+        seen = game_map.seen.T
+        lit = in_view.T[:, :, numpy.newaxis]
+        fg = numpy.where(lit, game_map.layer("fgcolor").transpose(1, 0, 2)
+                        , numpy.array(tuple(libtcod.black), dtype=numpy.uint8))
+        bg = numpy.where(lit, game_map.layer("bgcolor").transpose(1, 0, 2)
+                        , numpy.array(tuple(libtcod.darkest_grey), dtype=numpy.uint8))
+        self.chars[seen] = game_map.layer("char").T[seen]
+        self.fg[seen] = fg[seen]
+        self.bg[seen] = bg[seen]
+
+    def present(self):
+        if self.front is not None:
+            chars, fg, bg = self.front
+            if numpy.array_equal(chars, self.chars) and \
+                    numpy.array_equal(fg, self.fg) and \
+                    numpy.array_equal(bg, self.bg):
+                self.pushed = 0
+                return 0
+        self.fill()
+        self.pushed = self.width * self.height
+        return self.pushed
+
+    def fill(self):
+        libtcod.console_fill_char(self.console, self.chars.ravel())
+        libtcod.console_fill_foreground(self.console, self.fg[:, :, 0].ravel()
+                                    , self.fg[:, :, 1].ravel(), self.fg[:, :, 2].ravel())
+        libtcod.console_fill_background(self.console, self.bg[:, :, 0].ravel()
+                                    , self.bg[:, :, 1].ravel(), self.bg[:, :, 2].ravel())
+        self.front = (self.chars.copy(), self.fg.copy(), self.bg.copy())
+
+    def invalidate(self):
+        self.front = None
+
+
+class ImageCache(object):
+    """
+        Loads each image in a directory once and keeps the handle.
+        get() loads on first use, preload() loads a list up front, and
+        free_all() releases every image, call it at shutdown.
+    """
+    def __init__(self, image_dir):
+        self.image_dir = image_dir
+        self.images = {}
+
+    def get(self, name):
+        image = self.images.get(name)
+        if image is None:
+            image = libtcod.image_load(os.path.join(self.image_dir, name))
+            self.images[name] = image
+        return image
+
+    def preload(self, names):
+        for name in names:
+            self.get(name)
+
+    def memory_usage(self):
+        """
+            Bytes held by the loaded images, at 3 bytes a pixel.
+        """
+        total = 0
+        for image in self.images.values():
+            w, h = libtcod.image_get_size(image)
+            total += w * h * 3
+        return total
+
+    def free_all(self):
+        for image in self.images.values():
+            libtcod.image_delete(image)
+        self.images = {}
+
+
+class ScreenCache(object):
+    """
+        Full screens drawn once into offscreen consoles and blitted after.
+        show(name, draw, key) calls draw(console) the first time the named
+        screen shows, and again only when key differs from last time.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.screens = {}
+
+    def show(self, name, draw, key=None):
+        if name in self.screens:
+            last_key, con = self.screens[name]
+            if key != last_key:
+                libtcod.console_clear(con)
+                draw(con)
+        else:
+            con = libtcod.console_new(self.width, self.height)
+            libtcod.console_set_default_foreground(con, libtcod.white)
+            draw(con)
+        self.screens[name] = (key, con)
+        libtcod.console_blit(con, 0, 0, self.width, self.height, 0, 0, 0)
+
+    def invalidate(self, name):
+        """ redraw the named screen next time it shows """
+        if name in self.screens:
+            libtcod.console_delete(self.screens[name][1])
+            del self.screens[name]
+
+    def free_all(self):
+        for key, con in self.screens.values():
+            libtcod.console_delete(con)
+        self.screens = {}
+
+
+class Command(object):
+    """
+        A game command bound to the function that runs it and its
+        arguments, e.g. Command("move", game_turn, -1, 1).
+        Call it to run it. str() gives it back as keymap text.
     """
-        Represents a hole in the fence, similar to the stairs in a dungeon.
+    def __init__(self, name, func, *args):
+        self.name = name
+        self.func = func
+        self.args = args
+
+    def __call__(self):
+        return self.func(*self.args)
+
+    def __str__(self):
+        return " ".join([self.name] + [str(arg) for arg in self.args])
+
+    def __repr__(self):
+        return "<Command %s>" % (self)
+
+
+class CommandRegistry(object):
+    """
+        Game commands by name.
+        bind() makes a Command with its arguments, parse() does the same
+        from keymap text like "move -1 1".
     """
     def __init__(self):
-        super(Hole, self).__init__()
-        self.char = "O"
+        self.commands = {}
+
+    def register(self, name, func):
+        self.commands[name] = func
+
+    def names(self):
+        return sorted(self.commands.keys())
+
+    def bind(self, name, *args):
+        if not name in self.commands:
+            raise KeyError("unknown command: %s" % (name))
+        return Command(name, self.commands[name], *args)
+
+    def parse(self, text):
+        words = text.split()
+        args = []
+        for word in words[1:]:
+            try:
+                args.append(int(word))
+            except ValueError:
+                args.append(word)
+        return self.bind(words[0], *args)
 
 
 class KeyHandler(object):
     """
-        Handles keystrokes and maps them to functions.
+        Handles keystrokes and maps them to commands.
         Supports multiple game states. Neat, huh.
+        poll() queues the keys pressed since the last frame without
+        blocking, run_pending() runs their commands.
     """
+    # a keymap comment starts a line or follows whitespace
+    COMMENT = re.compile(r"(?:^|\s)#")
+
     def __init__(self):
         self.actionsdb = {}
+        self.pending = collections.deque()
+        self.key = libtcod.Key()
+        self.mouse = libtcod.Mouse()
     
     def add_actions(self, state, actions):
-        self.actionsdb[state] = actions
+        self.actionsdb.setdefault(state, {}).update(actions)
     
-    def handle_stroke(self, state):
+    def bindings(self, state):
         """
-             key may be a libtcod.KEY_CODE or a letter.
+            List the (key, command) pairs for a state.
         """
-        key = libtcod.console_wait_for_keypress(True)
-        if not key.pressed:
-            return None         # ignore key releases
-        if key.vk == libtcod.KEY_CHAR: 
-            key = chr(key.c)
-        else:
-            key = key.vk
-        if self.actionsdb[state].has_key(key):
-            return self.actionsdb[state][key]
+        return self.actionsdb.get(state, {}).items()
+
+    def load_keymap(self, path, registry):
+        """
+            Rebind keys from a keymap file. Each line reads
+                state  key  command  [args]
+            e.g. "playing KEY_KP1 move -1 1" or "playing w move 0 -1".
+            state is a STATE_ name without the prefix, key a libtcod KEY_
+            name or a single letter. A # starts a comment at the start of a
+            line, or after a space once the key is read, so
+            "playing # wait  # stay put" binds the # key.
+        """
+        f = open(path)
+        lines = f.readlines()
+        f.close()
+        for number, line in enumerate(lines):
+            words = line.split(None, 2)
+            if not words or words[0].startswith("#"):
+                continue
+            if len(words) == 3:
+                words[2] = self.COMMENT.split(words[2], 1)[0]
+            try:
+                state, key, command = words
+                state = getattr(C, "STATE_" + state.upper())
+                if key.startswith("KEY_"):
+                    key = getattr(libtcod, key)
+                elif len(key) != 1:
+                    raise ValueError("bad key")
+                self.add_actions(state, {key: registry.parse(command)})
+            except (ValueError, AttributeError, KeyError, IndexError), e:
+                raise ValueError("%s line %s: %s" % (path, number + 1, e))
+
+    def poll(self):
+        """
+             Queue every key pressed since the last poll.
+             Keys queue as a libtcod.KEY_CODE or a letter.
+        """
+        key = self.key
+        while libtcod.sys_check_for_event(libtcod.EVENT_KEY_PRESS
+                                        , key, self.mouse):
+            if key.vk == libtcod.KEY_CHAR:
+                self.pending.append(chr(key.c))
+            else:
+                self.pending.append(key.vk)
+
+    def run_pending(self, gamestate, limit):
+        """
+            Run the commands of up to limit queued keys, so held movement
+            keys play out as a batch of turns between two frames.
+            When a command changes the game state the rest of the queue
+            is dropped, so held keys don't spill into the next screen.
+            Returns how many commands ran.
+        """
+        ran = 0
+        while self.pending and ran < limit:
+            state = gamestate.peek()
+            depth = len(gamestate.stack)
+            cmd = self.actionsdb.get(state, {}).get(self.pending.popleft())
+            if cmd:
+                cmd()
+                ran += 1
+                if gamestate.peek() != state or len(gamestate.stack) != depth:
+                    self.pending.clear()
+        return ran
 
 #=========================================================[[ Unit Test ]]
 if __name__ == "__main__":
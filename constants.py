@@ -1,4 +1,4 @@
-import lib.libtcodpy as libtcod
+from lib.backend import libtcod
 VERSION = "0.2"
 
 # engine
@@ -7,6 +7,7 @@ SCREEN_HEIGHT = 50
 FOV_ALGO = 0
 FOV_LIGHT_WALLS = True
 LIMIT_FPS = 20
+KEYS_PER_FRAME = 16     # most queued keys handled between two frames
 FULLSCREEN = False
 
 # drawing positions
@@ -21,6 +22,17 @@ STAT_HEART_TOP = 6
 STATS_SCREEN_LEFT = 14
 STATS_SCREEN_TOP = 12
 
+# images loaded at startup, the npc icons load when first needed
+SCREEN_IMAGES = ("background.png", "intro.png", "about-frame.png"
+                , "dialogue-frame.png", "stats-frame.png", "icon-paw.png")
+
+# optional key rebindings, see KeyHandler.load_keymap
+KEYMAP_PATH = "keymap.cfg"
+
+# built levels, see factory.LevelCache
+LEVEL_CACHE_DIR = "data/levels"   # replays with TOPDOG_SEED only
+LEVEL_CACHE_SIZE = 16   # levels kept in memory
+
 # game states
 
 STATE_MENU = 0x0
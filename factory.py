@@ -5,10 +5,18 @@
 
 import os
 import copy
-import random
-import lib.libtcodpy as libtcod
+import hashlib
+import threading
+import rng
+from lib.backend import libtcod
 import constants as C
 import classes as cls
+import mappack
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 
 # define our tile characters here so we can do easy ascii to map lookups
 CHAR_FENCE = "#"
@@ -22,52 +30,42 @@ CHAR_TREE = chr(6)
 CHAR_BUSH = chr(5)
 CHAR_FLOWERS = chr(15)
 
-def dice(sides):
-    return random.randint(0, sides) == 0
+def dice(sides, stream="spawn"):
+    return rng.get(stream).randint(0, sides) == 0
     
 #===============================================================[[ Foliage ]]
 
 def get_tree():
     names = ('Tree', 'Oak Tree', 'Bark Tree', 'Big Tree')
     colors = (libtcod.darkest_lime, libtcod.darkest_amber, libtcod.darkest_orange, libtcod.darkest_green)
-    fol = cls.ItemBase()
-    fol.char = CHAR_TREE
-    fol.name = random.choice(names)
-    fol.fgcolor = random.choice(colors)
-    fol.blocking = False
-    fol.seethrough = False
-    return fol
+    return cls.TILES.get(char=CHAR_TREE
+                        ,name=rng.get("map").choice(names)
+                        ,fgcolor=rng.get("map").choice(colors)
+                        ,seethrough=False)
 
 def get_bush():
     names = ('Shrubbery', 'Thicket', 'Thornbush', 'Rosebush')
     colors = (libtcod.darkest_chartreuse
             , libtcod.darkest_green, libtcod.darkest_lime)
-    fol = cls.ItemBase()
-    fol.char = CHAR_BUSH
-    fol.name = random.choice(names)
-    fol.fgcolor = random.choice(colors)
-    fol.blocking = False
-    fol.fov_limit = random.randint(1, 3)
-    return fol
+    return cls.TILES.get(char=CHAR_BUSH
+                        ,name=rng.get("map").choice(names)
+                        ,fgcolor=rng.get("map").choice(colors)
+                        ,fov_limit=rng.get("map").randint(1, 3))
     
 def get_flower():
     names = ('Flowers', 'Roses')
     colors = (libtcod.light_amber, libtcod.light_magenta
             , libtcod.light_red, libtcod.light_azure, libtcod.light_yellow)
-    fol = cls.ItemBase()
-    fol.char = CHAR_FLOWERS
-    fol.name = random.choice(names)
-#    fol.bgcolor = libtcod.dark_green
-    fol.fgcolor = random.choice(colors)
-    fol.blocking = False
-    fol.fov_limit = random.randint(1, 3)
-    return fol
+    return cls.TILES.get(char=CHAR_FLOWERS
+                        ,name=rng.get("map").choice(names)
+#                        ,bgcolor=libtcod.dark_green
+                        ,fgcolor=rng.get("map").choice(colors)
+                        ,fov_limit=rng.get("map").randint(1, 3))
 
 def spawn_foliage(currentmap, amount, thicket_size=4, density=10):
     """
-        spawn amount of random foliages, using currentmap to test against
-        overlapping locations. Take care not to spawn too many when the 
-        map is full, this will enter an unbreakable loop.
+        spawn amount of random foliages around blank map cells. When the
+        map is too full for more, fewer are spawned.
         
         adjust the <thicket_size> and <density> parameters accordingly.
     """
@@ -76,30 +74,32 @@ def spawn_foliage(currentmap, amount, thicket_size=4, density=10):
                     ,get_flower
                     )
 
+    spots = [(x, y) for x, y in currentmap.blank_cells()
+                if x < C.MAP_WIDTH - thicket_size
+                and y < C.MAP_HEIGHT - thicket_size]
+    is_blank = lambda x, y: currentmap.tile(x, y).isblank()
     for loop in range(amount):
-        while True:
-            x = random.randint(0, C.MAP_WIDTH - thicket_size - 1)
-            y = random.randint(0, C.MAP_HEIGHT - thicket_size - 1)
-            if currentmap[x][y].isblank():
-                for thicket in range(density):
-                    tx = x + random.randint(1, thicket_size)
-                    ty = y +random.randint(1, thicket_size)
-                    if currentmap[tx][ty].isblank():
-                        currentmap[tx][ty] = random.choice(plant_choices)()
-                break
+        spot = pick_cell(rng.get("map"), spots, is_blank)
+        if spot is None:
+            break
+        x, y = spot
+        for thicket in range(density):
+            tx = x + rng.get("map").randint(1, thicket_size)
+            ty = y +rng.get("map").randint(1, thicket_size)
+            if currentmap.tile(tx, ty).isblank():
+                currentmap.set_tile(tx, ty
+                                ,rng.get("map").choice(plant_choices)())
 
 #=================================================================[[ Water ]]
 
 def get_pool_tile():
     colors = (libtcod.sky, libtcod.azure, libtcod.dark_cyan, libtcod.dark_azure)
-    puddle = cls.ItemBase()
-    puddle.drinkable = True
-    puddle.char = CHAR_WATER
-    puddle.name = "pool"
-    puddle.fgcolor = random.choice(colors)
-    puddle.bgcolor = libtcod.darker_sky
-    puddle.message = "*splash*"
-    return puddle
+    return cls.TILES.get(char=CHAR_WATER
+                        ,name="pool"
+                        ,fgcolor=rng.get("map").choice(colors)
+                        ,bgcolor=libtcod.darker_sky
+                        ,drinkable=True
+                        ,message="*splash*")
 
 def spawn_pond(currentmap, amount, pond_size=4, density=6):
     """
@@ -107,8 +107,8 @@ def spawn_pond(currentmap, amount, pond_size=4, density=6):
     """
     for loop in range(amount):
         while True:
-            x = random.randint(pond_size + 3, C.MAP_WIDTH - pond_size - 3)
-            y = random.randint(pond_size + 3, C.MAP_HEIGHT - pond_size - 3)
+            x = rng.get("map").randint(pond_size + 3, C.MAP_WIDTH - pond_size - 3)
+            y = rng.get("map").randint(pond_size + 3, C.MAP_HEIGHT - pond_size - 3)
             
             if density == 0:
                 # fill the entire range
@@ -116,63 +116,107 @@ def spawn_pond(currentmap, amount, pond_size=4, density=6):
                 y = y - pond_size
                 for ty in range(pond_size):
                     for tx in range(pond_size):
-                        tile = currentmap[x + tx][y + ty]
+                        tile = currentmap.tile(x + tx, y + ty)
                         if tile.isblank():
-                            wetness = get_pool_tile()
-                            wetness.char = CHAR_WATER
-                            wetness.fgcolor = POOL_FG
-                            wetness.bgcolor = POOL_BG
-                            wetness.name = "Pool"
-                            currentmap[x + tx][y + ty] = wetness
+                            wetness = cls.TILES.get(char=CHAR_WATER
+                                                ,name="Pool"
+                                                ,fgcolor=POOL_FG
+                                                ,bgcolor=POOL_BG
+                                                ,drinkable=True
+                                                ,message="*splash*")
+                            currentmap.set_tile(x + tx, y + ty, wetness)
                 break
             else:
                 # spot fill the range
                 for litres in range(density):
-                    tx = x + random.randint(1, pond_size)
-                    ty = y +random.randint(1, pond_size)
-                    if currentmap[tx][ty].isblank():
-                        # transfer the current cell bgcolor
-                        bgcolor = currentmap[tx][ty].bgcolor
-                        puddle = get_pool_tile()
-                        currentmap[tx][ty] = puddle
+                    tx = x + rng.get("map").randint(1, pond_size)
+                    ty = y +rng.get("map").randint(1, pond_size)
+                    if currentmap.tile(tx, ty).isblank():
+                        currentmap.set_tile(tx, ty, get_pool_tile())
             break
 
-#=============================================================[[ Inventory ]]
+#=============================================================[[ Placement ]]
+
+# objects stay this many cells in from the map edges
+PLACE_MARGIN = 4
+# near placements pick anywhere this close, before looking further out
+PLACE_RADIUS = 4
+# random picks to try before checking every cell
+PICK_TRIES = 8
+
+def pick_cell(stream, cells, accept=None):
+    """
+        A random (x, y) of cells that accept(x, y) allows, or None if
+        none do. A few random picks are tried, then every cell is checked,
+        so the time taken is bounded however few cells are allowed.
+    """
+    if not cells:
+        return None
+    for tries in range(PICK_TRIES):
+        xy = stream.choice(cells)
+        if accept is None or accept(*xy):
+            return xy
+    cells = [xy for xy in cells if accept(*xy)]
+    if cells:
+        return stream.choice(cells)
+    return None
+
+def find_place(game_map, game_objects, near_xy=None, radius=None):
+    """
+        A blank, unoccupied map cell for a new object, or None if there
+        is none. With near_xy the cell is picked from the nearest cells to
+        it that have room, within radius if given. Without a radius, any
+        cell inside PLACE_RADIUS counts as nearest.
+    """
+    cells = game_map.blank_cells(PLACE_MARGIN)
+    unoccupied = lambda x, y: not game_objects.at(x, y)
+    if near_xy is None:
+        return pick_cell(rng.get("spawn"), cells, unoccupied)
+    # rings of cells by distance
+    near_x, near_y = near_xy
+    spread = radius is None and PLACE_RADIUS or 0
+    rings = {}
+    for x, y in cells:
+        distance = max(abs(x - near_x), abs(y - near_y), spread)
+        if (radius is None or distance <= radius) and unoccupied(x, y):
+            rings.setdefault(distance, []).append((x, y))
+    if not rings:
+        return None
+    return rng.get("spawn").choice(rings[min(rings)])
 
-def place_on_map(game_map, game_objects, item, near_xy=None):
+def place_on_map(game_map, game_objects, item, near_xy=None, radius=None):
     """
         place item on a blank map tile. dont overlap existing objects either.
+        near_xy and radius are as for find_place(). Returns False, leaving
+        the item where it is, when there is no such place.
     """
-    tries = 0
-    radius = 4
-    while True:
-        tries = tries + 1
-        if tries % 10 == 0:
-            radius = radius + 1
-        if near_xy:
-            x = random.randint(near_xy[0] - radius, near_xy[0] + radius)
-            y = random.randint(near_xy[1] - radius, near_xy[1] + radius)
-            if x > C.MAP_WIDTH - 3:
-                x = C.MAP_WIDTH - 3
-            if y > C.MAP_HEIGHT - 3:
-                y = C.MAP_HEIGHT - 3
-            if x < 4:
-                x = 4
-            if y < 4:
-                y = 4
-        else:
-            x = random.randint(4, C.MAP_WIDTH - 4)
-            y = random.randint(4, C.MAP_HEIGHT - 4)
-        # test against blocked map tiles
-        try_again = game_map[x][y].blocking
-        # test against object collisions
-        if not try_again:
-            for obj in game_objects:
-                if obj.x == x and obj.y == y:
-                    try_again = True
-        if game_map[x][y].isblank() and not try_again:
-            item.x, item.y = (x, y)
-            break
+    xy = find_place(game_map, game_objects, near_xy, radius)
+    if xy is None:
+        return False
+    item.x, item.y = xy
+    return True
+
+def place_story_object(game_map, game_objects, item, near_xy=None):
+    """
+        place an object the storyline can't go without. When place_on_map
+        finds no room, any blank cell with no being on it will do, right
+        up to the fence. Returns False only if there is none of those.
+    """
+    if place_on_map(game_map, game_objects, item, near_xy):
+        return True
+    cells = [(x, y) for x, y in game_map.blank_cells()
+                if not game_objects.blocking_at(x, y)]
+    if not cells:
+        return False
+    if near_xy is None:
+        item.x, item.y = rng.get("spawn").choice(cells)
+    else:
+        near_x, near_y = near_xy
+        item.x, item.y = min(cells, key=lambda xy:
+                            max(abs(xy[0] - near_x), abs(xy[1] - near_y)))
+    return True
+
+#=============================================================[[ Inventory ]]
 
 def get_toy():
     """
@@ -187,7 +231,7 @@ def get_toy():
 #                , libtcod.lighter_lime, libtcod.lighter_sea, libtcod.lighter_han
 #                , libtcod.lighter_violet, libtcod.lighter_fuchsia)
     toy = cls.ItemBase()
-    toy.name = random.choice(toy_names)
+    toy.name = rng.get("spawn").choice(toy_names)
     toy.char = CHAR_FOOD
     toy.fgcolor = libtcod.yellow
     toy.carryable = True
@@ -200,7 +244,7 @@ def get_food():
     """
     names = ("a biscuit", "a cherry pie", "a bone", "a banana", "salami", "a peach", "a pizza slice")
     eat = cls.ItemBase()
-    eat.name = random.choice(names)
+    eat.name = rng.get("spawn").choice(names)
     eat.char = CHAR_FOOD
     eat.fgcolor = libtcod.light_magenta
     eat.carryable = True
@@ -345,8 +389,8 @@ def add_random_quest(game_map, game_objects):
     )
     
     title = "%npcb: find %item"
-    dialogue = random.choice(dialogues)
-    success = random.choice(thankyous)
+    dialogue = rng.get("spawn").choice(dialogues)
+    success = rng.get("spawn").choice(thankyous)
     
     quest_item = get_toy()
     quest_master = get_random_npc()
@@ -360,18 +404,21 @@ def add_random_quest(game_map, game_objects):
         else:
             quest_npc = get_random_npc()
         dialogue = dialogue.replace("%npca", quest_npc.name)
-        place_on_map(game_map, game_objects, quest_npc)
-        game_objects.append(quest_npc)
         quest_item.x = 0
+        keeper = quest_npc
     else:
         dialogue = dialogue.replace("%npca", "some thief")
-        place_on_map(game_map, game_objects, quest_item)
-        game_objects.append(quest_item)
+        keeper = quest_item
     # set quest giver dialogue
     dialogue = dialogue.replace("%item", quest_item.name)
     quest_master.action_ai.dialogue_text = dialogue
-    # place all on the map
-    place_on_map(game_map, game_objects, quest_master)
+    # place all on the map, or leave the quest out if the yard is full
+    if not place_on_map(game_map, game_objects, keeper):
+        return
+    game_objects.append(keeper)
+    if not place_on_map(game_map, game_objects, quest_master):
+        game_objects.remove(keeper)
+        return
     game_objects.append(quest_master)
     # glue the quest together
     link_quest(game_map, game_objects 
@@ -395,21 +442,21 @@ def get_random_npc(npc_char=None, attack_rating=None, dialogue_text=None):
         ,"p": "parrot"
     }
     if not npc_char:
-        npc_char = random.choice(dna_bank.keys())
+        npc_char = rng.get("spawn").choice(dna_bank.keys())
     # NPC
     npc = cls.AnimalBase()
     npc.blocking = True
     npc.char = npc_char
     npc.fgcolor = libtcod.light_sky
     npc.name = dna_bank[npc_char]
-    npc.move_step = random.randint(1, 3)
-    npc.dialogue_text = dialogue_text
+    npc.move_step = rng.get("spawn").randint(1, 3)
     # move AI
     mov = cls.MoveAI(npc)
     npc.move_ai = mov
-    mov.behaviour = random.choice((cls.MoveAI.NEUTRAL, cls.MoveAI.SKITTISH))
+    mov.behaviour = rng.get("spawn").choice((cls.MoveAI.NEUTRAL, cls.MoveAI.SKITTISH))
     # action AI
     act = cls.ActionAI(npc)
+    act.dialogue_text = dialogue_text
     if attack_rating:
         if attack_rating > 0:
             mov.behaviour = cls.MoveAI.HUNTING
@@ -420,6 +467,27 @@ def get_random_npc(npc_char=None, attack_rating=None, dialogue_text=None):
     return npc
 
 
+# level progression grid format
+# --------------------------------
+#     NPC     |  TOYS   |  FOOD |
+# --------------------------------
+#   (min,max, |         |       |
+#     attack_rating)    |       |
+#             |,(min,max)       |
+#             |       ,(min,max)|
+LEVEL_PROGRESSION = (
+    ((0, 1, 1)  ,(1, 2)  ,(1, 1))
+   ,((0, 1, 1)  ,(1, 2)  ,(1, 1))
+   ,((0, 1, 1)  ,(1, 3)  ,(1, 1))
+   ,((0, 2, 1)  ,(1, 3)  ,(1, 1))
+   ,((1, 2, 2)  ,(2, 3)  ,(1, 2))
+   ,((1, 2, 2)  ,(2, 3)  ,(1, 2))
+   ,((1, 3, 2)  ,(2, 4)  ,(1, 2))
+   ,((1, 3, 2)  ,(2, 4)  ,(1, 3))
+   ,((2, 4, 3)  ,(6, 9)  ,(2, 3))
+   ,((2, 4, 3)  ,(2, 4)  ,(2, 3))
+)
+
 def spawn_level_objects(game_map, game_level):
     """
         create a bunch of level objects.
@@ -427,49 +495,28 @@ def spawn_level_objects(game_map, game_level):
     toys = 0
     npcs = 0
     food = 0
-    objects = []
+    objects = cls.ObjectIndex()
     
-    # level progression grid format
-    # --------------------------------
-    #     NPC     |  TOYS   |  FOOD |
-    # --------------------------------
-    #   (min,max, |         |       |
-    #     attack_rating)    |       |
-    #             |,(min,max)       |
-    #             |       ,(min,max)|
-    progression = (
-        ((0, 1, 1)  ,(1, 2)  ,(1, 1))
-       ,((0, 1, 1)  ,(1, 2)  ,(1, 1))
-       ,((0, 1, 1)  ,(1, 3)  ,(1, 1))
-       ,((0, 2, 1)  ,(1, 3)  ,(1, 1))
-       ,((1, 2, 2)  ,(2, 3)  ,(1, 2))
-       ,((1, 2, 2)  ,(2, 3)  ,(1, 2))
-       ,((1, 3, 2)  ,(2, 4)  ,(1, 2))
-       ,((1, 3, 2)  ,(2, 4)  ,(1, 3))
-       ,((2, 4, 3)  ,(6, 9)  ,(2, 3))
-       ,((2, 4, 3)  ,(2, 4)  ,(2, 3))
-    )
-    
-    prog = progression[game_level]
-    npcs = random.randint(prog[0][0], prog[0][1])
-    toys = random.randint(prog[1][0], prog[1][1])
-    food = random.randint(prog[2][0], prog[2][1])
+    prog = LEVEL_PROGRESSION[game_level]
+    npcs = rng.get("spawn").randint(prog[0][0], prog[0][1])
+    toys = rng.get("spawn").randint(prog[1][0], prog[1][1])
+    food = rng.get("spawn").randint(prog[2][0], prog[2][1])
         
     # npcs
     for item in range(npcs):
-        npc = get_random_npc(npc_char=None, attack_rating=random.randint(0, prog[0][2]))
-        place_on_map(game_map, objects, npc)
-        objects.append(npc)
+        npc = get_random_npc(npc_char=None, attack_rating=rng.get("spawn").randint(0, prog[0][2]))
+        if place_on_map(game_map, objects, npc):
+            objects.append(npc)
     # toys
     for item in range(toys):
         toy = get_toy()
-        place_on_map(game_map, objects, toy)
-        objects.append(toy)
+        if place_on_map(game_map, objects, toy):
+            objects.append(toy)
     # food
     for item in range(food):
         eat = get_food()
-        place_on_map(game_map, objects, eat)
-        objects.append(eat)
+        if place_on_map(game_map, objects, eat):
+            objects.append(eat)
     
     return objects
 
@@ -483,8 +530,8 @@ def get_random_dialogue():
 def add_random_npc(game_map, game_objects, npc_char=None, attack_rating=None, dialogue_text=None):
     npc = get_random_npc()
     npc.action_ai.dialogue_text = dialogue_text
-    place_on_map(game_map, game_objects, npc)
-    game_objects.append(npc)
+    if place_on_map(game_map, game_objects, npc):
+        game_objects.append(npc)
     
 
 def spawn_level_quests(game_map, game_objects, game_level):
@@ -601,10 +648,10 @@ def spawn_level_storyline(game_map, game_objects, player):
             , quest_npc=npc_a, success_dialogue=dlg_b, success_command=None
             )
         
-        place_on_map(game_map, game_objects, player, near_xy=(2, 2))
-        place_on_map(game_map, game_objects, npc, near_xy=(player.x, player.y))
-        place_on_map(game_map, game_objects, npc_b, near_xy=(C.MAP_WIDTH, 2))
-        place_on_map(game_map, game_objects, npc_a, near_xy=(2, C.MAP_HEIGHT))
+        place_story_object(game_map, game_objects, player, near_xy=(2, 2))
+        place_story_object(game_map, game_objects, npc, near_xy=(player.x, player.y))
+        place_story_object(game_map, game_objects, npc_b, near_xy=(C.MAP_WIDTH, 2))
+        place_story_object(game_map, game_objects, npc_a, near_xy=(2, C.MAP_HEIGHT))
         game_objects.extend((npc, npc_b, npc_a))
 
 
@@ -633,7 +680,7 @@ def spawn_level_storyline(game_map, game_objects, player):
         qdata.npc_name = npc_name = "Girly"
         qdata.title = "Talk to Girly the dog"
         player.give_quest(qdata, silent=False)
-        place_on_map(game_map, game_objects, npc_a)
+        place_story_object(game_map, game_objects, npc_a)
         game_objects.append(npc_a)
         
     elif player.level == 3:
@@ -642,14 +689,14 @@ def spawn_level_storyline(game_map, game_objects, player):
         npc_b.action_ai.dialogue_text = (
             "Ye, I know of the Fat Cats... the Mafioso they call themselves." \
                 "\n\nI'd watch your back if I were you, those Cats scratch!")
-        place_on_map(game_map, game_objects, npc_b)
+        place_story_object(game_map, game_objects, npc_b)
         game_objects.append(npc_b)
         
     elif player.level == 4:
         npc_b = get_random_npc(npc_char=None, attack_rating=None)
         npc_b.char="C"
         npc_b.name = "Fat Cat Charles"
-        npc_b.move_ai.behavior = cls.MoveAI.NEUTRAL
+        npc_b.move_ai.behaviour = cls.MoveAI.NEUTRAL
         npc_b.picture = "icon-fat cat.png"
         npc_b.action_ai.dialogue_text = [
             "Find my nephew, Jinx, in the next yard. He can tell you how " \
@@ -660,7 +707,7 @@ def spawn_level_storyline(game_map, game_objects, player):
                 "\n\nwell, a couple of the other Cats are naughty, like mischief too much."
             ,"*hiss and sputters*\n\nHey hey take it easy, rover!"
             ]
-        place_on_map(game_map, game_objects, npc_b)
+        place_story_object(game_map, game_objects, npc_b)
         game_objects.append(npc_b)
         
     elif player.level == 5:
@@ -675,13 +722,13 @@ def spawn_level_storyline(game_map, game_objects, player):
                 "how you took it from me..."
             ,"My uncle Charlie sent you, huh? Well fine..." \
                 "\n\n*Jinx shoves a toy mouse to and fro*"]
-        place_on_map(game_map, game_objects, npc_a)
+        place_story_object(game_map, game_objects, npc_a)
         game_objects.append(npc_a)
         
         # spawn a jingly ball toy nearby
         toy = get_toy()
         toy.name = "Jinx's Jingly Ball"
-        place_on_map(game_map, game_objects, toy, near_xy=(npc_a.x, npc_a.y))
+        place_story_object(game_map, game_objects, toy, near_xy=(npc_a.x, npc_a.y))
         game_objects.append(toy)
 
     elif player.level == 6:
@@ -693,7 +740,7 @@ def spawn_level_storyline(game_map, game_objects, player):
                 " I don't trust them." \
                 "\n\nI bet they work with those Fat Cats, and they steal my seed!"
             ]
-        place_on_map(game_map, game_objects, npc_a)
+        place_story_object(game_map, game_objects, npc_a)
         game_objects.append(npc_a)
         
         npc_b = get_random_npc(npc_char="j", attack_rating=None)
@@ -704,14 +751,14 @@ def spawn_level_storyline(game_map, game_objects, player):
                 "I have some friends who need animals like you.\n\n" \
                 "Let me go talk to some friends..."
             ]
-        place_on_map(game_map, game_objects, npc_b)
+        place_story_object(game_map, game_objects, npc_b)
         game_objects.append(npc_b)
 
     elif player.level == 7:
         npc_b = get_random_npc(npc_char=None, attack_rating=None)
         npc_b.char="C"
         npc_b.name = "Fat Cat Tiny"
-        npc_b.move_ai.behavior = cls.MoveAI.NEUTRAL
+        npc_b.move_ai.behaviour = cls.MoveAI.NEUTRAL
         npc_b.picture = "icon-fat cat.png"
         npc_b.action_ai.dialogue_text = [
             "We still like your style, come on next door, maybe you can help us..."
@@ -719,7 +766,7 @@ def spawn_level_storyline(game_map, game_objects, player):
                 "some advice: Stay clear of Jinx, or else..."
             ,"*grimmaces* So you're the Jingly Ball con? *purrrs*"
             ]
-        place_on_map(game_map, game_objects, npc_b)
+        place_story_object(game_map, game_objects, npc_b)
         game_objects.append(npc_b)
         
     elif player.level == 8:
@@ -730,7 +777,7 @@ def spawn_level_storyline(game_map, game_objects, player):
             "*squawks* Oh you gave me a fright!\n\nI'm watching all those Fat Cats " \
                 "across the other side of the yard. I wonder what they are up to..."
             ]
-        place_on_map(game_map, game_objects, npc_a, near_xy=(player.x, player.y))
+        place_story_object(game_map, game_objects, npc_a, near_xy=(player.x, player.y))
         game_objects.append(npc_a)
         
         # make a gang of Fat Cats. place a lead in front to meet you with dialogue.
@@ -755,15 +802,15 @@ def spawn_level_storyline(game_map, game_objects, player):
             npc_b.char="C"
             npc_b.name = "Mafioso %s" % (i)
             npc_b.action_ai.hostile = True
-            npc_b.move_ai.behavior = cls.MoveAI.HUNTING
-            place_on_map(game_map, game_objects, npc_b, near_xy=gang_xy)
+            npc_b.move_ai.behaviour = cls.MoveAI.HUNTING
+            place_story_object(game_map, game_objects, npc_b, near_xy=gang_xy)
             game_objects.append(npc_b)
         # and the lead
         npc_c = get_random_npc(npc_char=None, attack_rating=1)
         npc_c.char="C"
         npc_c.name = "Mafioso Boss"
         npc_c.action_ai.hostile = True
-        npc_c.move_ai.behavior = cls.MoveAI.HUNTING
+        npc_c.move_ai.behaviour = cls.MoveAI.HUNTING
         npc_c.picture = "icon-fat cat.png"
         npc_c.action_ai.dialogue_text = [
             "In fact, I setup this 'meeting' to trick you. If you want this Puppy " \
@@ -771,7 +818,7 @@ def spawn_level_storyline(game_map, game_objects, player):
             ,"We hear you are looking for this Puppy. You probably thought we want " \
                 "your help...."
         ]
-        place_on_map(game_map, game_objects, npc_c, near_xy=lead_xy)
+        place_story_object(game_map, game_objects, npc_c, near_xy=lead_xy)
         game_objects.append(npc_c)
             
         # tutu the hostage bird
@@ -782,7 +829,7 @@ def spawn_level_storyline(game_map, game_objects, player):
             "They keep the Puppy in the next yard, go rescue him, quickly!"
             ,"Thank you for chasing them away! I thought they were going to eat me alive!"
             ]
-        place_on_map(game_map, game_objects, npc_d, near_xy=gang_xy)
+        place_story_object(game_map, game_objects, npc_d, near_xy=gang_xy)
         game_objects.append(npc_d)
 
     elif player.level == 9:
@@ -792,14 +839,14 @@ def spawn_level_storyline(game_map, game_objects, player):
         npc_a.name = "Puppy"
         npc_a.tag = "puppy"
         npc_a.picture = "icon-puppy.png"
-        npc_a.move_ai.behavior = cls.MoveAI.NEUTRAL
+        npc_a.move_ai.behaviour = cls.MoveAI.NEUTRAL
         npc_a.move_step = 1        
         npc_a.action_ai.dialogue_text = [
             "We better go, before they return..."
             ,"Top Dog! I am so glad to see you!\n\nThose Fat Cats are nasty, " \
                 "but I bit a couple of them..."
             ]
-        place_on_map(game_map, game_objects, npc_a, near_xy=None)
+        place_story_object(game_map, game_objects, npc_a)
         game_objects.append(npc_a)
 
         
@@ -809,84 +856,64 @@ def spawn_level_storyline(game_map, game_objects, player):
 
 def blank_map():
     """
-        Return a new, blank map array.
+        Return a new, blank map array. The map is numpy backed if we can.
     """
 #    colors = (libtcod.darkest_lime, libtcod.darkest_green
 #            , libtcod.darkest_sea, libtcod.darkest_chartreuse)
-    newmap = [[ cls.ItemBase(
-                fgcolor=libtcod.darker_green
-                ,bgcolor=libtcod.darker_green) 
-    for y in range(C.MAP_HEIGHT)]
-        for x in range(C.MAP_WIDTH)]
-    return newmap
+    grass = cls.TILES.get(fgcolor=libtcod.darker_green
+                        ,bgcolor=libtcod.darker_green)
+    if cls.numpy_available:
+        return cls.ArrayTileMap(C.MAP_WIDTH, C.MAP_HEIGHT, grass)
+    return cls.TileMap(C.MAP_WIDTH, C.MAP_HEIGHT, grass)
 
 def get_fence():
-    panel = cls.ItemBase()
-    panel.name = "Fence"
-    panel.char = CHAR_FENCE
-    panel.bgcolor = libtcod.dark_sepia
-    panel.fgcolor = libtcod.dark_sepia
-    panel.blocking = True
-    panel.seethrough = False
-    return panel
+    return cls.TILES.get(char=CHAR_FENCE
+                        ,name="Fence"
+                        ,fgcolor=libtcod.dark_sepia
+                        ,bgcolor=libtcod.dark_sepia
+                        ,blocking=True
+                        ,seethrough=False)
 
 def get_hole():
-    hole = cls.Hole()
-    hole.name = "Space/Enter crawls through this hole..."
-    hole.bgcolor = libtcod.darker_sepia
-    hole.fgcolor = libtcod.lighter_sepia
-    return hole
+    """
+        A hole in the fence, similar to the stairs in a dungeon.
+    """
+    return cls.TILES.get(char="O"
+                        ,name="Space/Enter crawls through this hole..."
+                        ,fgcolor=libtcod.lighter_sepia
+                        ,bgcolor=libtcod.darker_sepia
+                        ,warp=True)
 
 def place_fence_holes(game_map):
     """
         Make a few random fence holes. Test they are at least next to grass
         or foliage to crawl through.
     """
-    halfx = C.MAP_WIDTH / 2
-    halfy = C.MAP_HEIGHT / 2
-    for holes in range(random.randint(2, 4)):
-        while True:
-            x = random.randint(0, C.MAP_WIDTH - 1)
-            y = random.randint(0, C.MAP_HEIGHT - 1)
-            xo = 0
-            yo = 0
-            # snap the x/y to the nearest border
-            # but only x, or only y, depending on dice roll
-            if random.randint(0, 1) == 0:
-                if x < halfx:
-                    x = 0
-                    xo = 1
-                    yo = y
-                else:
-                    x = C.MAP_WIDTH - 1
-                    xo = x - 1
-                    yo = y
-                yo
-            else:
-                if y < halfy:
-                    y = 0
-                    yo = 1
-                    xo = x
-                else:
-                    y = C.MAP_HEIGHT - 1
-                    yo = y - 1
-                    xo = x
-            # test there is a space or foliage alongside
-            if game_map[xo][yo].isblank():
-                game_map[x][y] = get_hole()
-                break
+    spots = []
+    for x in range(1, C.MAP_WIDTH - 1):
+        spots.append(((x, 0), (x, 1)))
+        spots.append(((x, C.MAP_HEIGHT - 1), (x, C.MAP_HEIGHT - 2)))
+    for y in range(1, C.MAP_HEIGHT - 1):
+        spots.append(((0, y), (1, y)))
+        spots.append(((C.MAP_WIDTH - 1, y), (C.MAP_WIDTH - 2, y)))
+    # test there is a space or foliage alongside
+    spots = [xy for xy, inside in spots if game_map.tile(*inside).isblank()]
+    holes = rng.get("map").randint(2, 4)
+    for x, y in rng.get("map").sample(spots, min(holes, len(spots))):
+        game_map.set_tile(x, y, get_hole())
     
 
 def build_fence(game_map):
     """
         Outline the yard with a fence like structure.
     """
+    fence = get_fence()
     for y in range(C.MAP_HEIGHT - 0):
-        game_map[0][y] = get_fence()
-        game_map[C.MAP_WIDTH - 1][y] = get_fence()
+        game_map.set_tile(0, y, fence)
+        game_map.set_tile(C.MAP_WIDTH - 1, y, fence)
     for x in range(C.MAP_WIDTH - 0):
-        game_map[x][0] = get_fence()
-        game_map[x][C.MAP_HEIGHT - 1] = get_fence()
+        game_map.set_tile(x, 0, fence)
+        game_map.set_tile(x, C.MAP_HEIGHT - 1, fence)
     place_fence_holes(game_map)
 
 
@@ -907,124 +934,386 @@ def get_brick(color=libtcod.dark_grey):
     """
         Make a brick tile.
     """
-    brick = cls.ItemBase()
-    brick.blocking = True
-    brick.seethrough = False
-    brick.name = "wall"
-    brick.char = CHAR_BRICK
-    brick.fgcolor = libtcod.darker_grey
-    brick.bgcolor = color
-    return brick
+    return cls.TILES.get(char=CHAR_BRICK
+                        ,name="wall"
+                        ,fgcolor=libtcod.darker_grey
+                        ,bgcolor=color
+                        ,blocking=True
+                        ,seethrough=False)
 
 def get_path():
     """
         Make a gravel tile.
     """
-    t = cls.ItemBase()
-    t.blocking = False
-    t.seethrough = True
-    t.fgcolor = random.choice((libtcod.darkest_green, libtcod.darkest_sea, libtcod.darkest_chartreuse))
-    t.char = CHAR_GRAVEL
-    t.name = ""
-    return t
+    return cls.TILES.get(char=CHAR_GRAVEL
+                        ,name=""
+                        ,fgcolor=rng.get("map").choice((libtcod.darkest_green
+                                    , libtcod.darkest_sea
+                                    , libtcod.darkest_chartreuse)))
 
 def get_tile(char="?", fgcolor=libtcod.white, bgcolor=libtcod.red
             , blocks=False, seethrough=True, name="", msg=None):
     """
         Make a stone tile.
     """
-    t = cls.ItemBase()
-    t.blocking = blocks
-    t.seethrough = seethrough
-    t.bgcolor = bgcolor
-    t.fgcolor = fgcolor
-    t.char = char
-    t.name = name
-    t.message = msg
-    return t
+    return cls.TILES.get(char=char
+                        ,name=name
+                        ,fgcolor=fgcolor
+                        ,bgcolor=bgcolor
+                        ,blocking=blocks
+                        ,seethrough=seethrough
+                        ,message=msg)
     
 def flip_map(game_map):
     """
         Transform the map by mirroring it on X/Y.
     """
-    # mirror x
-    if random.randint(0, 1) == 0:
-        game_map.reverse()
-    # mirror y
-    if random.randint(0, 1) == 0:
-        for e in game_map:
-            e.reverse()
+    mirror_x = rng.get("map").randint(0, 1) == 0
+    mirror_y = rng.get("map").randint(0, 1) == 0
+    game_map.flip(mirror_x, mirror_y)
     
+# the compiled map pack, opened on first use. see mappack.py
+MAP_PACK = []
+
+def get_map_pack():
+    """
+        Return the MapPack, built anew if a map file changed since, or
+        None if it can't be built, and the map files are read instead.
+    """
+    if not MAP_PACK:
+        pack = None
+        try:
+            if mappack.pack_outdated():
+                mappack.build_map_pack(mappack.read_ascii_maps())
+            pack = mappack.MapPack()
+        except (IOError, OSError, ValueError):
+            pack = None
+        MAP_PACK.append(pack)
+    return MAP_PACK[0]
+
 def read_map_file(map_index):
     """
-        Read an ASCII map file and return it as a list of lines.
+        Read an ASCII map and return it as a list of lines.
+        Maps come from the map pack, or the map file if we have no pack.
     """
+    pack = get_map_pack()
+    if pack:
+        return pack.get(map_index)
     f = open(os.path.join('data', 'maps', 'map%s' % (map_index)))
-    contents = f.read(3000)
+    contents = f.read()
     f.close()
     map_data = contents.split("\n")
     return map_data
     
-def map_from_ascii(game_map, maps_available):
+# ascii map characters and the tile makers they stand for, since the ascii
+# maps can't contain special chars. makers flagged as varying make random
+# variants and are called for every cell, the rest are called once a map.
+TILE_MAKERS = {
+    "B": (False, lambda: get_brick(libtcod.darker_grey))
+    ,"R": (False, lambda: get_brick(libtcod.darker_flame))
+    ,"=": (False, lambda: get_tile(CHAR_STONE, fgcolor=libtcod.darkest_grey
+                                , bgcolor=libtcod.darker_green))
+    ,"-": (False, lambda: get_tile('-', fgcolor=libtcod.dark_green
+                                , bgcolor=libtcod.dark_green))
+    ,"&": (True, lambda: get_tile('&', bgcolor=libtcod.darkest_yellow
+                                , fgcolor=rng.get("map").choice((libtcod.darkest_yellow
+                                    , libtcod.darkest_lime, libtcod.darker_gray))
+                                , blocks=True, name='compost'
+                                , msg='the compost stinks good!'))
+    ,"[": (False, lambda: get_tile('[', bgcolor=libtcod.dark_grey
+                                , fgcolor=libtcod.light_grey, blocks=True
+                                , seethrough=False, name='car'))
+    ,"#": (False, get_fence)
+    ,CHAR_GRAVEL: (True, get_path)
+    ,";": (True, get_path)
+    ,CHAR_WATER: (True, get_pool_tile)
+    ,'f': (True, get_flower)
+    ,'t': (True, get_tree)
+    ,'b': (True, get_bush)
+}
+
+# compiled map templates by map index, see compile_map_template()
+MAP_TEMPLATES = {}
+
+def compile_map_template(map_data):
+    """
+        Compile ascii map lines into a list of (varies, maker, cells),
+        one entry per tile character used, cells being the list of map xy's.
+    """
+    groups = {}
+    for y, line in enumerate(map_data[:C.MAP_HEIGHT - 1 - 3]):
+        for x, asciic in enumerate(line[:C.MAP_WIDTH - 1 - 3]):
+            if asciic in TILE_MAKERS:
+                groups.setdefault(asciic, []).append((x + 2, y + 2))
+    return [TILE_MAKERS[asciic] + (cells,) for asciic, cells
+                                            in sorted(groups.items())]
+
+def get_map_template(map_index):
+    """
+        Return the compiled template for map_index, reading the map file
+        the first time only.
+    """
+    template = MAP_TEMPLATES.get(map_index)
+    if template is None:
+        template = compile_map_template(read_map_file(map_index))
+        MAP_TEMPLATES[map_index] = template
+    return template
+
+def pick_map_template(maps_available):
+    """
+        The map index of the next yard. This is the first draw of a level.
+    """
+    return rng.get("map").randint(1, maps_available)
+
+def map_from_ascii(game_map, map_index):
     """
         Load map tiles from an ascii representation.
     """
-    # here we can map ascii values to our tile objects
-    # since the ascii maps can't contain special chars
-    tile_lookup = {
-                    "B": "get_brick(libtcod.darker_grey)"
-                    ,"R": "get_brick(libtcod.darker_flame)"
-                    ,"=": "get_tile(CHAR_STONE, fgcolor=libtcod.darkest_grey, bgcolor=libtcod.darker_green)"
-                    ,"-": "get_tile('-', fgcolor=libtcod.dark_green, bgcolor=libtcod.dark_green)"
-                    ,"&": "get_tile('&', bgcolor=libtcod.darkest_yellow, fgcolor=random.choice((libtcod.darkest_yellow, libtcod.darkest_lime, libtcod.darker_gray)), blocks=True, name='compost', msg='the compost stinks good!')"
-                    ,"[": "get_tile('[', bgcolor=libtcod.dark_grey, fgcolor=libtcod.light_grey, blocks=True, seethrough=False, name='car')"
-                    ,"#": "get_fence()"
-                    ,CHAR_GRAVEL: "get_path()"
-                    ,";": "get_path()"
-                    ,CHAR_WATER: "get_pool_tile()"
-                    ,'f': "get_flower()"
-                    ,'t': "get_tree()"
-                    ,'b': "get_bush()"
-                }
-#                get_tile(char="?", color=libtcod.white, blocks=False, seethrough=True, name="")
-#char="?", fgcolor=libtcod.white, bgcolor=libtcod.red
-#            , blocks=False, seethrough=True, name="", msg=None
-
-    map_data = read_map_file(random.randint(1, maps_available))
-    for y in range(C.MAP_HEIGHT - 1 - 3):
-        for x in range(C.MAP_WIDTH - 1 - 3):
-            asciic = map_data[y][x]
-            if asciic in tile_lookup:
-                tile = eval(tile_lookup[asciic])
-                game_map[x + 2][y + 2] = tile
+    template = get_map_template(map_index)
+    for varies, maker, cells in template:
+        if varies:
+            for x, y in cells:
+                game_map.set_tile(x, y, maker())
+        else:
+            tile = maker()
+            for x, y in cells:
+                game_map.set_tile(x, y, tile)
 
 def count_available_maps():
     """
         Get the count of maps available.
     """
+    pack = get_map_pack()
+    if pack:
+        return pack.count
     for num in range(100):
         if not os.path.exists(os.path.join("data", "maps", "map%s" % (num + 1))):
             return num
             break
 
-def generate_map(maps_avail):
+def build_fov_map(game_map):
     """
-        Generate a level map, plant trees and objects and NPC's.
+        Make a libtcod map of game_map for fov and path finding.
+        Open ground is the default, only the walls, foliage and water
+        are set cell by cell.
+    """
+    fov_map = libtcod.map_new(C.MAP_WIDTH, C.MAP_HEIGHT)
+    libtcod.map_clear(fov_map, True, True)
+    for x, y, seethrough, walkable in game_map.closed_cells():
+        libtcod.map_set_properties(fov_map, x, y, seethrough, walkable)
+    return fov_map
+
+def generate_map(map_index):
+    """
+        Generate a level map from map template map_index, plant trees and
+        build the fence.
     """
     game_map = blank_map()
-    map_from_ascii(game_map, maps_avail)
+    map_from_ascii(game_map, map_index)
     flip_map(game_map)
     plant_foliage(game_map)
     build_fence(game_map)
-    fov_map = libtcod.map_new(C.MAP_WIDTH, C.MAP_HEIGHT)
-    for y in range(C.MAP_HEIGHT - 1):
-        for x in range(C.MAP_WIDTH - 1):
-            libtcod.map_set_properties(fov_map, x, y
-                                        ,game_map[x][y].seethrough
-                                        ,not game_map[x][y].blocking and \
-                                         not game_map[x][y].drinkable)
+    return game_map
+
+def build_level(maps_avail, game_level, cache=None):
+    """
+        Build everything of a level that doesn't need the player: the map
+        and the level's npcs, items and quests. Draws from the current
+        level streams, so call rng.begin_level(game_level) first.
+        A level found in cache is loaded instead, new ones are stored.
+        Returns game_map, fov_map, path_map, objects.
+    """
+    map_index = pick_map_template(maps_avail)
+    level = None
+    if cache:
+        key = cache.key(rng.current(), map_index)
+        level = cache.load(key)
+    if level:
+        game_map, objects = level
+    else:
+        game_map = generate_map(map_index)
+        objects = spawn_level_objects(game_map, game_level)
+        spawn_level_quests(game_map, objects, game_level)
+        if cache:
+            cache.store(key, game_map, objects)
+    fov_map = build_fov_map(game_map)
     path_map = libtcod.path_new_using_map(fov_map)
-    return game_map, fov_map, path_map
+    return game_map, fov_map, path_map, objects
+
+
+#========================================================[[ Pre-generation ]]
+
+class LevelBuilder(object):
+    """
+        Builds the next level on a worker thread while this one is played.
+        start(level) begins building, take(level) waits for it and returns
+        what build_level() would, or None if the build doesn't match the
+        level the game is about to begin (another level or seed), in which
+        case build synchronously instead.
+        The worker builds from a fork of the game streams, so a prebuilt
+        level is the same level a synchronous build gives.
+    """
+    def __init__(self, maps_avail, cache=None):
+        self.maps_avail = maps_avail
+        self.cache = cache
+        self.thread = None
+        self.streams = None
+        self.game_level = None
+        self.level = None
+
+    def start(self, game_level):
+        """
+            Start building game_level, unless that is building already.
+        """
+        if self.thread:
+            if self.game_level == game_level \
+                    and self.streams.seed == rng.current().seed:
+                return
+            self.thread.join()
+        self.streams = rng.current().fork()
+        self.game_level = game_level
+        self.level = None
+        self.thread = threading.Thread(target=self.build, args=(game_level,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def build(self, game_level):
+        rng.use(self.streams)
+        rng.begin_level(game_level)
+        try:
+            self.level = build_level(self.maps_avail, game_level, self.cache)
+        except Exception:
+            # the synchronous build will raise it again, where it shows
+            self.level = None
+
+    def take(self, game_level):
+        """
+            Swap in the prebuilt level, its level streams included.
+        """
+        if not self.thread or self.game_level != game_level:
+            return None
+        self.thread.join()
+        self.thread = None
+        level, self.level = self.level, None
+        streams = rng.current()
+        if level is None or self.streams.seed != streams.seed \
+                or self.streams.level != streams.next_level(game_level):
+            return None
+        streams.adopt(self.streams)
+        return level
+
+
+#===========================================================[[ Level cache ]]
+
+# bump this when level building changes, to leave old cached levels behind
+LEVEL_CACHE_VERSION = 3
+
+class LevelCache(object):
+    """
+        Built levels, pickled, by a key of everything that decides what
+        gets built: the seed, level, attempt, map template and the level's
+        progression. The last size levels used stay in memory, and every
+        level is kept in cache_dir too, if given.
+        load() gives a fresh copy each time and puts the level streams
+        where building the level left them, so a loaded level plays the
+        same as a built one. hits and misses count the loads.
+    """
+    def __init__(self, cache_dir=None, size=C.LEVEL_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.entries = {}
+        self.order = []
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, streams, map_index):
+        """
+            The key of the level streams are building, on map map_index.
+        """
+        level, attempt = streams.level
+        parts = (LEVEL_CACHE_VERSION, streams.seed, level, attempt, map_index
+                , "\n".join(read_map_file(map_index))
+                , LEVEL_PROGRESSION[level])
+        return hashlib.md5(":".join(str(part) for part in parts)).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, "%s.level" % (key))
+
+    def load(self, key):
+        """
+            Return game_map, objects of a cached level, or None.
+        """
+        data = self.get(key)
+        level = None
+        if data is not None:
+            try:
+                game_map, objects, state = pickle.loads(data)
+                rng.current().set_level_state(state)
+                level = game_map, cls.ObjectIndex(objects)
+            except Exception:
+                # from an older game, build it anew
+                level = None
+        self.lock.acquire()
+        if level:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.lock.release()
+        return level
+
+    def store(self, key, game_map, objects):
+        """
+            Cache a level just built, before anything has moved.
+        """
+        data = pickle.dumps((game_map, list(objects)
+                            , rng.current().level_state())
+                            , pickle.HIGHEST_PROTOCOL)
+        self.remember(key, data)
+        if not self.cache_dir:
+            return
+        temp_path = "%s.%s" % (self.path(key), os.getpid())
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            f = open(temp_path, "wb")
+            f.write(data)
+            f.close()
+            os.rename(temp_path, self.path(key))
+        except (IOError, OSError):
+            # the disk cache is only a nicety
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def get(self, key):
+        """ the pickled level from memory, or from disk """
+        self.lock.acquire()
+        data = self.entries.get(key)
+        self.lock.release()
+        if data is None and self.cache_dir:
+            try:
+                f = open(self.path(key), "rb")
+                data = f.read()
+                f.close()
+            except IOError:
+                return None
+        if data is not None:
+            self.remember(key, data)
+        return data
+
+    def remember(self, key, data):
+        """ keep data in memory, forgetting the least recently used """
+        self.lock.acquire()
+        if key in self.entries:
+            self.order.remove(key)
+        self.entries[key] = data
+        self.order.append(key)
+        while len(self.order) > self.size:
+            del self.entries[self.order.pop(0)]
+        self.lock.release()
+
+    def __str__(self):
+        return "level cache: %s hits, %s misses" % (self.hits, self.misses)
 
 
 #===============================================================[[ Libtcod ]]
@@ -1033,7 +1322,7 @@ def init_libtcod():
     startup_msg = ("analyzing air quality...", "calculating primordial soup..."
         ,"reading the future...", "carbon dating your hard drive..."
         ,"finding prime numbers...")
-    print(random.choice(startup_msg))
+    print(rng.get("flavour").choice(startup_msg))
     libtcod.console_set_custom_font('data/fonts/terminal12x12_gs_ro.png', 
                                     libtcod.FONT_TYPE_GREYSCALE |
                                     libtcod.FONT_LAYOUT_ASCII_INROW)
@@ -1066,6 +1355,28 @@ def init_libtcod():
                                         ,libtcod.black)
     return libtcod.console_new(C.MAP_WIDTH, C.MAP_HEIGHT)
 
+def get_renderer(canvas):
+    """
+        Return a renderer for the map canvas, numpy backed if we can.
+    """
+    if cls.numpy_available:
+        return cls.BulkRenderer(canvas, C.MAP_WIDTH, C.MAP_HEIGHT)
+    return cls.Renderer(canvas, C.MAP_WIDTH, C.MAP_HEIGHT)
+
+def get_flee_map(chase_map, game_map):
+    """
+        Return the FleeMap off chase_map, numpy backed if we can.
+    """
+    if cls.numpy_available and isinstance(game_map, cls.ArrayTileMap):
+        return cls.ArrayFleeMap(chase_map, game_map)
+    return cls.FleeMap(chase_map, game_map)
+
+def get_entity_store(game_objects):
+    """
+        Return the store that takes the npc turns.
+    """
+    return cls.EntityStore(game_objects)
+
 #=============================================================[[ Unit Test ]]
 if __name__ == "__main__":
     pass
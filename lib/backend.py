@@ -0,0 +1,21 @@
+#
+# picks the libtcod implementation the game runs on:
+#
+#   the native libtcod 1.5.1 wrapper (lib/libtcodpy.py), or
+#   lib/headless.py when TOPDOG_HEADLESS is set in the environment, as
+#   simulate.py and balance.py do.
+#
+# the game itself needs the native library, and stops with the load
+# error when it can't be found. it imports libtcod from here:
+#
+#   from lib.backend import libtcod
+#
+
+import os
+
+if os.environ.get("TOPDOG_HEADLESS"):
+    import lib.headless as libtcod
+else:
+    import lib.libtcodpy as libtcod
+
+headless = libtcod.__name__ == "lib.headless"
@@ -0,0 +1,970 @@
+#
+# headless stand-in for the libtcod 1.5.1 python wrapper
+#
+# pure python versions of the parts of libtcodpy topdog uses: colours,
+# key constants, consoles as plain buffers, fov, a* paths and dijkstra
+# maps on a map, and image handles that only know their size.
+# nothing is drawn and no key is ever pressed, so the game logic, map
+# generation and AI run without libtcod.so or a display.
+#
+# import it through lib.backend, which picks this module when
+# TOPDOG_HEADLESS is set.
+#
+
+import heapq
+import struct
+
+HEADLESS = True
+
+
+class Color(object):
+    __slots__ = ('r', 'g', 'b')
+
+    def __init__(self, r=0, g=0, b=0):
+        self.r = r
+        self.g = g
+        self.b = b
+
+    def __eq__(self, c):
+        return isinstance(c, Color) and \
+                (self.r, self.g, self.b) == (c.r, c.g, c.b)
+
+    def __ne__(self, c):
+        return not self == c
+
+    def __hash__(self):
+        return hash((self.r, self.g, self.b))
+
+    def __mul__(self, c):
+        if isinstance(c, Color):
+            return Color(self.r * c.r // 255, self.g * c.g // 255
+                        , self.b * c.b // 255)
+        return Color(*[min(255, max(0, int(v * c))) for v in self])
+
+    def __add__(self, c):
+        return Color(min(255, self.r + c.r), min(255, self.g + c.g)
+                    , min(255, self.b + c.b))
+
+    def __sub__(self, c):
+        return Color(max(0, self.r - c.r), max(0, self.g - c.g)
+                    , max(0, self.b - c.b))
+
+    def __repr__(self):
+        return "Color(%d,%d,%d)" % (self.r, self.g, self.b)
+
+    def __reduce__(self):
+        return (Color, (self.r, self.g, self.b))
+
+    def __getitem__(self, i):
+        if type(i) == str:
+            return getattr(self, i)
+        else:
+            return getattr(self, "rgb"[i])
+
+    def __setitem__(self, i, c):
+        if type(i) == str:
+            setattr(self, i, c)
+        else:
+            setattr(self, "rgb"[i], c)
+
+    def __iter__(self):
+        yield self.r
+        yield self.g
+        yield self.b
+
+# default colors
+# grey levels
+black=Color(0,0,0)
+darkest_grey=Color(31,31,31)
+darker_grey=Color(63,63,63)
+dark_grey=Color(95,95,95)
+grey=Color(127,127,127)
+light_grey=Color(159,159,159)
+lighter_grey=Color(191,191,191)
+lightest_grey=Color(223,223,223)
+darkest_gray=Color(31,31,31)
+darker_gray=Color(63,63,63)
+dark_gray=Color(95,95,95)
+gray=Color(127,127,127)
+light_gray=Color(159,159,159)
+lighter_gray=Color(191,191,191)
+lightest_gray=Color(223,223,223)
+white=Color(255,255,255)
+
+# sepia
+darkest_sepia=Color(31,24,15)
+darker_sepia=Color(63,50,31)
+dark_sepia=Color(94,75,47)
+sepia=Color(127,101,63)
+light_sepia=Color(158,134,100)
+lighter_sepia=Color(191,171,143)
+lightest_sepia=Color(222,211,195)
+
+#standard colors
+red=Color(255,0,0)
+flame=Color(255,63,0)
+orange=Color(255,127,0)
+amber=Color(255,191,0)
+yellow=Color(255,255,0)
+lime=Color(191,255,0)
+chartreuse=Color(127,255,0)
+green=Color(0,255,0)
+sea=Color(0,255,127)
+turquoise=Color(0,255,191)
+cyan=Color(0,255,255)
+sky=Color(0,191,255)
+azure=Color(0,127,255)
+blue=Color(0,0,255)
+han=Color(63,0,255)
+violet=Color(127,0,255)
+purple=Color(191,0,255)
+fuchsia=Color(255,0,255)
+magenta=Color(255,0,191)
+pink=Color(255,0,127)
+crimson=Color(255,0,63)
+
+# dark colors
+dark_red=Color(191,0,0)
+dark_flame=Color(191,47,0)
+dark_orange=Color(191,95,0)
+dark_amber=Color(191,143,0)
+dark_yellow=Color(191,191,0)
+dark_lime=Color(143,191,0)
+dark_chartreuse=Color(95,191,0)
+dark_green=Color(0,191,0)
+dark_sea=Color(0,191,95)
+dark_turquoise=Color(0,191,143)
+dark_cyan=Color(0,191,191)
+dark_sky=Color(0,143,191)
+dark_azure=Color(0,95,191)
+dark_blue=Color(0,0,191)
+dark_han=Color(47,0,191)
+dark_violet=Color(95,0,191)
+dark_purple=Color(143,0,191)
+dark_fuchsia=Color(191,0,191)
+dark_magenta=Color(191,0,143)
+dark_pink=Color(191,0,95)
+dark_crimson=Color(191,0,47)
+
+# darker colors
+darker_red=Color(127,0,0)
+darker_flame=Color(127,31,0)
+darker_orange=Color(127,63,0)
+darker_amber=Color(127,95,0)
+darker_yellow=Color(127,127,0)
+darker_lime=Color(95,127,0)
+darker_chartreuse=Color(63,127,0)
+darker_green=Color(0,127,0)
+darker_sea=Color(0,127,63)
+darker_turquoise=Color(0,127,95)
+darker_cyan=Color(0,127,127)
+darker_sky=Color(0,95,127)
+darker_azure=Color(0,63,127)
+darker_blue=Color(0,0,127)
+darker_han=Color(31,0,127)
+darker_violet=Color(63,0,127)
+darker_purple=Color(95,0,127)
+darker_fuchsia=Color(127,0,127)
+darker_magenta=Color(127,0,95)
+darker_pink=Color(127,0,63)
+darker_crimson=Color(127,0,31)
+
+# darkest colors
+darkest_red=Color(63,0,0)
+darkest_flame=Color(63,15,0)
+darkest_orange=Color(63,31,0)
+darkest_amber=Color(63,47,0)
+darkest_yellow=Color(63,63,0)
+darkest_lime=Color(47,63,0)
+darkest_chartreuse=Color(31,63,0)
+darkest_green=Color(0,63,0)
+darkest_sea=Color(0,63,31)
+darkest_turquoise=Color(0,63,47)
+darkest_cyan=Color(0,63,63)
+darkest_sky=Color(0,47,63)
+darkest_azure=Color(0,31,63)
+darkest_blue=Color(0,0,63)
+darkest_han=Color(15,0,63)
+darkest_violet=Color(31,0,63)
+darkest_purple=Color(47,0,63)
+darkest_fuchsia=Color(63,0,63)
+darkest_magenta=Color(63,0,47)
+darkest_pink=Color(63,0,31)
+darkest_crimson=Color(63,0,15)
+
+# light colors
+light_red=Color(255,114,114)
+light_flame=Color(255,149,114)
+light_orange=Color(255,184,114)
+light_amber=Color(255,219,114)
+light_yellow=Color(255,255,114)
+light_lime=Color(219,255,114)
+light_chartreuse=Color(184,255,114)
+light_green=Color(114,255,114)
+light_sea=Color(114,255,184)
+light_turquoise=Color(114,255,219)
+light_cyan=Color(114,255,255)
+light_sky=Color(114,219,255)
+light_azure=Color(114,184,255)
+light_blue=Color(114,114,255)
+light_han=Color(149,114,255)
+light_violet=Color(184,114,255)
+light_purple=Color(219,114,255)
+light_fuchsia=Color(255,114,255)
+light_magenta=Color(255,114,219)
+light_pink=Color(255,114,184)
+light_crimson=Color(255,114,149)
+
+#lighter colors
+lighter_red=Color(255,165,165)
+lighter_flame=Color(255,188,165)
+lighter_orange=Color(255,210,165)
+lighter_amber=Color(255,232,165)
+lighter_yellow=Color(255,255,165)
+lighter_lime=Color(232,255,165)
+lighter_chartreuse=Color(210,255,165)
+lighter_green=Color(165,255,165)
+lighter_sea=Color(165,255,210)
+lighter_turquoise=Color(165,255,232)
+lighter_cyan=Color(165,255,255)
+lighter_sky=Color(165,232,255)
+lighter_azure=Color(165,210,255)
+lighter_blue=Color(165,165,255)
+lighter_han=Color(188,165,255)
+lighter_violet=Color(210,165,255)
+lighter_purple=Color(232,165,255)
+lighter_fuchsia=Color(255,165,255)
+lighter_magenta=Color(255,165,232)
+lighter_pink=Color(255,165,210)
+lighter_crimson=Color(255,165,188)
+
+# lightest colors
+lightest_red=Color(255,191,191)
+lightest_flame=Color(255,207,191)
+lightest_orange=Color(255,223,191)
+lightest_amber=Color(255,239,191)
+lightest_yellow=Color(255,255,191)
+lightest_lime=Color(239,255,191)
+lightest_chartreuse=Color(223,255,191)
+lightest_green=Color(191,255,191)
+lightest_sea=Color(191,255,223)
+lightest_turquoise=Color(191,255,239)
+lightest_cyan=Color(191,255,255)
+lightest_sky=Color(191,239,255)
+lightest_azure=Color(191,223,255)
+lightest_blue=Color(191,191,255)
+lightest_han=Color(207,191,255)
+lightest_violet=Color(223,191,255)
+lightest_purple=Color(239,191,255)
+lightest_fuchsia=Color(255,191,255)
+lightest_magenta=Color(255,191,239)
+lightest_pink=Color(255,191,223)
+lightest_crimson=Color(255,191,207)
+
+# desaturated colors
+desaturated_red=Color(127,63,63)
+desaturated_flame=Color(127,79,63)
+desaturated_orange=Color(127,95,63)
+desaturated_amber=Color(127,111,63)
+desaturated_yellow=Color(127,127,63)
+desaturated_lime=Color(111,127,63)
+desaturated_chartreuse=Color(95,127,63)
+desaturated_green=Color(63,127,63)
+desaturated_sea=Color(63,127,95)
+desaturated_turquoise=Color(63,127,111)
+desaturated_cyan=Color(63,127,127)
+desaturated_sky=Color(63,111,127)
+desaturated_azure=Color(63,95,127)
+desaturated_blue=Color(63,63,127)
+desaturated_han=Color(79,63,127)
+desaturated_violet=Color(95,63,127)
+desaturated_purple=Color(111,63,127)
+desaturated_fuchsia=Color(127,63,127)
+desaturated_magenta=Color(127,63,111)
+desaturated_pink=Color(127,63,95)
+desaturated_crimson=Color(127,63,79)
+
+# metallic
+brass=Color(191,151,96)
+copper=Color(197,136,124)
+gold=Color(229,191,0)
+silver=Color(203,203,203)
+
+# miscellaneous
+celadon=Color(172,255,175)
+peach=Color(255,159,127)
+
+# background rendering modes
+BKGND_NONE = 0
+BKGND_SET = 1
+BKGND_MULTIPLY = 2
+BKGND_LIGHTEN = 3
+BKGND_DARKEN = 4
+BKGND_SCREEN = 5
+BKGND_COLOR_DODGE = 6
+BKGND_COLOR_BURN = 7
+BKGND_ADD = 8
+BKGND_ADDA = 9
+BKGND_BURN = 10
+BKGND_OVERLAY = 11
+BKGND_ALPH = 12
+BKGND_DEFAULT=13
+
+# non blocking key events types
+KEY_PRESSED = 1
+KEY_RELEASED = 2
+# key codes
+KEY_NONE = 0
+KEY_ESCAPE = 1
+KEY_BACKSPACE = 2
+KEY_TAB = 3
+KEY_ENTER = 4
+KEY_SHIFT = 5
+KEY_CONTROL = 6
+KEY_ALT = 7
+KEY_PAUSE = 8
+KEY_CAPSLOCK = 9
+KEY_PAGEUP = 10
+KEY_PAGEDOWN = 11
+KEY_END = 12
+KEY_HOME = 13
+KEY_UP = 14
+KEY_LEFT = 15
+KEY_RIGHT = 16
+KEY_DOWN = 17
+KEY_PRINTSCREEN = 18
+KEY_INSERT = 19
+KEY_DELETE = 20
+KEY_LWIN = 21
+KEY_RWIN = 22
+KEY_APPS = 23
+KEY_0 = 24
+KEY_1 = 25
+KEY_2 = 26
+KEY_3 = 27
+KEY_4 = 28
+KEY_5 = 29
+KEY_6 = 30
+KEY_7 = 31
+KEY_8 = 32
+KEY_9 = 33
+KEY_KP0 = 34
+KEY_KP1 = 35
+KEY_KP2 = 36
+KEY_KP3 = 37
+KEY_KP4 = 38
+KEY_KP5 = 39
+KEY_KP6 = 40
+KEY_KP7 = 41
+KEY_KP8 = 42
+KEY_KP9 = 43
+KEY_KPADD = 44
+KEY_KPSUB = 45
+KEY_KPDIV = 46
+KEY_KPMUL = 47
+KEY_KPDEC = 48
+KEY_KPENTER = 49
+KEY_F1 = 50
+KEY_F2 = 51
+KEY_F3 = 52
+KEY_F4 = 53
+KEY_F5 = 54
+KEY_F6 = 55
+KEY_F7 = 56
+KEY_F8 = 57
+KEY_F9 = 58
+KEY_F10 = 59
+KEY_F11 = 60
+KEY_F12 = 61
+KEY_NUMLOCK = 62
+KEY_SCROLLLOCK = 63
+KEY_SPACE = 64
+KEY_CHAR = 65
+
+CHAR_SUBP_SW = 232
+# font flags
+FONT_LAYOUT_ASCII_INCOL = 1
+FONT_LAYOUT_ASCII_INROW = 2
+FONT_TYPE_GREYSCALE = 4
+FONT_TYPE_GRAYSCALE = 4
+FONT_LAYOUT_TCOD = 8
+# color control codes
+COLCTRL_1=1
+COLCTRL_2=2
+COLCTRL_3=3
+COLCTRL_4=4
+COLCTRL_5=5
+COLCTRL_NUMBER=5
+COLCTRL_FORE_RGB=6
+COLCTRL_BACK_RGB=7
+COLCTRL_STOP=8
+# renderers
+RENDERER_GLSL=0
+RENDERER_OPENGL=1
+RENDERER_SDL=2
+NB_RENDERERS=3
+# alignment
+LEFT=0
+RIGHT=1
+CENTER=2
+
+# events
+EVENT_KEY_PRESS=1
+EVENT_KEY_RELEASE=2
+EVENT_KEY=EVENT_KEY_PRESS|EVENT_KEY_RELEASE
+EVENT_MOUSE_MOVE=4
+EVENT_MOUSE_PRESS=8
+EVENT_MOUSE_RELEASE=16
+EVENT_MOUSE=EVENT_MOUSE_MOVE|EVENT_MOUSE_PRESS|EVENT_MOUSE_RELEASE
+EVENT_ANY=EVENT_KEY|EVENT_MOUSE
+
+FOV_BASIC = 0
+FOV_DIAMOND = 1
+FOV_SHADOW = 2
+FOV_PERMISSIVE_0 = 3
+FOV_PERMISSIVE_1 = 4
+FOV_PERMISSIVE_2 = 5
+FOV_PERMISSIVE_3 = 6
+FOV_PERMISSIVE_4 = 7
+FOV_PERMISSIVE_5 = 8
+FOV_PERMISSIVE_6 = 9
+FOV_PERMISSIVE_7 = 10
+FOV_PERMISSIVE_8 = 11
+FOV_RESTRICTIVE = 12
+NB_FOV_ALGORITHMS = 13
+
+def FOV_PERMISSIVE(p) :
+    return FOV_PERMISSIVE_0+p
+
+
+class Key(object):
+    def __init__(self):
+        self.vk = KEY_NONE
+        self.c = 0
+        self.pressed = False
+        self.lalt = self.lctrl = self.ralt = self.rctrl = self.shift = False
+
+
+class Mouse(object):
+    def __init__(self):
+        self.x = self.y = self.dx = self.dy = 0
+        self.cx = self.cy = self.dcx = self.dcy = 0
+        self.lbutton = self.rbutton = self.mbutton = False
+        self.lbutton_pressed = self.rbutton_pressed = False
+        self.mbutton_pressed = False
+        self.wheel_up = self.wheel_down = False
+
+
+############################
+# console module
+############################
+class Console(object):
+    """
+        A console as three row-major buffers: char codes, fore and back
+        colours.
+    """
+    def __init__(self, w, h):
+        self.w = w
+        self.h = h
+        self.default_fg = white
+        self.default_bg = black
+        self.clear()
+
+    def clear(self):
+        n = self.w * self.h
+        self.chars = [ord(" ")] * n
+        self.fg = [self.default_fg] * n
+        self.bg = [self.default_bg] * n
+
+    def put(self, x, y, c, fore=None, back=None):
+        if 0 <= x < self.w and 0 <= y < self.h:
+            i = y * self.w + x
+            if isinstance(c, str):
+                c = ord(c)
+            self.chars[i] = c
+            if fore is not None:
+                self.fg[i] = fore
+            if back is not None:
+                self.bg[i] = back
+
+_root = None
+
+def _con(con):
+    if con == 0 or con is None:
+        return _root
+    return con
+
+def console_init_root(w, h, title, fullscreen=False, renderer=RENDERER_GLSL):
+    global _root
+    _root = Console(w, h)
+
+def console_get_width(con):
+    return _con(con).w
+
+def console_get_height(con):
+    return _con(con).h
+
+def console_set_custom_font(fontFile, flags=FONT_LAYOUT_ASCII_INCOL, nb_char_horiz=0, nb_char_vertic=0):
+    pass
+
+def console_set_window_title(title):
+    pass
+
+def console_is_window_closed():
+    # there is no window to keep open
+    return True
+
+def console_set_color_control(con, fore, back):
+    pass
+
+def console_set_default_background(con, col):
+    _con(con).default_bg = col
+
+def console_set_default_foreground(con, col):
+    _con(con).default_fg = col
+
+def console_clear(con):
+    _con(con).clear()
+
+def console_put_char(con, x, y, c, flag=BKGND_DEFAULT):
+    con = _con(con)
+    con.put(x, y, c, con.default_fg)
+
+def console_put_char_ex(con, x, y, c, fore, back):
+    _con(con).put(x, y, c, fore, back)
+
+def console_set_char(con, x, y, c):
+    _con(con).put(x, y, c)
+
+def console_get_char(con, x, y):
+    con = _con(con)
+    return con.chars[y * con.w + x]
+
+def console_get_char_foreground(con, x, y):
+    con = _con(con)
+    return con.fg[y * con.w + x]
+
+def console_get_char_background(con, x, y):
+    con = _con(con)
+    return con.bg[y * con.w + x]
+
+def _strip_controls(text):
+    out = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c in (chr(COLCTRL_FORE_RGB), chr(COLCTRL_BACK_RGB)):
+            i += 4
+            continue
+        if ord(c) <= COLCTRL_STOP and c != "\n":
+            i += 1
+            continue
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+def _print_lines(con, x, y, lines, alignment):
+    for line in lines:
+        if alignment == RIGHT:
+            left = x - len(line) + 1
+        elif alignment == CENTER:
+            left = x - len(line) // 2
+        else:
+            left = x
+        for i, c in enumerate(line):
+            con.put(left + i, y, c, con.default_fg)
+        y += 1
+
+def _wrap(text, w):
+    lines = []
+    for para in text.split("\n"):
+        line = ""
+        for word in para.split(" "):
+            if line and len(line) + 1 + len(word) > w:
+                lines.append(line)
+                line = word
+            else:
+                line = line and line + " " + word or word
+        lines.append(line)
+    return lines
+
+def console_print(con, x, y, fmt):
+    console_print_ex(con, x, y, BKGND_DEFAULT, LEFT, fmt)
+
+def console_print_ex(con, x, y, flag, alignment, fmt):
+    con = _con(con)
+    _print_lines(con, x, y, _strip_controls(fmt).split("\n"), alignment)
+
+def console_print_rect(con, x, y, w, h, fmt):
+    return console_print_rect_ex(con, x, y, w, h, BKGND_DEFAULT, LEFT, fmt)
+
+def console_print_rect_ex(con, x, y, w, h, flag, alignment, fmt):
+    con = _con(con)
+    lines = _wrap(_strip_controls(fmt), w or con.w - x)
+    if h:
+        lines = lines[:h]
+    _print_lines(con, x, y, lines, alignment)
+    return len(lines)
+
+def console_fill_char(con, arr):
+    con = _con(con)
+    con.chars = [int(c) for c in arr]
+
+def console_fill_foreground(con, r, g, b):
+    con = _con(con)
+    con.fg = [Color(int(cr), int(cg), int(cb)) for cr, cg, cb in zip(r, g, b)]
+
+def console_fill_background(con, r, g, b):
+    con = _con(con)
+    con.bg = [Color(int(cr), int(cg), int(cb)) for cr, cg, cb in zip(r, g, b)]
+
+def console_flush():
+    pass
+
+def console_new(w, h):
+    return Console(w, h)
+
+def console_blit(src, x, y, w, h, dst, xdst, ydst, ffade=1.0,bfade=1.0):
+    src = _con(src)
+    dst = _con(dst)
+    w = w or src.w
+    h = h or src.h
+    for cy in range(h):
+        for cx in range(w):
+            i = (y + cy) * src.w + x + cx
+            dst.put(xdst + cx, ydst + cy, src.chars[i], src.fg[i], src.bg[i])
+
+def console_delete(con):
+    pass
+
+def console_wait_for_keypress(flush):
+    return Key()
+
+def console_check_for_keypress(flags=KEY_RELEASED):
+    return Key()
+
+def console_is_key_pressed(key):
+    return False
+
+def sys_set_fps(fps):
+    pass
+
+def sys_get_fps():
+    return 0
+
+def sys_save_screenshot(name=None):
+    pass
+
+def sys_check_for_event(mask, k, m):
+    return 0
+
+def sys_wait_for_event(mask, k, m, flush):
+    return 0
+
+
+############################
+# image module
+############################
+class Image(object):
+    def __init__(self, w, h):
+        self.w = w
+        self.h = h
+
+def image_new(width, height):
+    return Image(width, height)
+
+def image_load(filename):
+    # only the size is needed, read it from the png header
+    w = h = 0
+    try:
+        f = open(filename, "rb")
+        header = f.read(24)
+        f.close()
+        if header[:8] == "\x89PNG\r\n\x1a\n":
+            w, h = struct.unpack(">II", header[16:24])
+    except IOError:
+        pass
+    return Image(w, h)
+
+def image_get_size(image):
+    return image.w, image.h
+
+def image_blit_rect(image, console, x, y, w, h, bkgnd_flag):
+    pass
+
+def image_blit_2x(image, console, dx, dy, sx=0, sy=0, w=-1, h=-1):
+    pass
+
+def image_delete(image):
+    pass
+
+
+############################
+# fov module
+############################
+class Map(object):
+    def __init__(self, w, h):
+        self.w = w
+        self.h = h
+        self.transparent = bytearray(w * h)
+        self.walkable = bytearray(w * h)
+        self.fov = bytearray(w * h)
+
+def map_new(w, h):
+    return Map(w, h)
+
+def map_copy(source, dest):
+    dest.transparent[:] = source.transparent
+    dest.walkable[:] = source.walkable
+    dest.fov[:] = source.fov
+
+def map_set_properties(m, x, y, isTrans, isWalk):
+    i = y * m.w + x
+    m.transparent[i] = bool(isTrans)
+    m.walkable[i] = bool(isWalk)
+
+def map_clear(m,walkable=False,transparent=False):
+    # the arguments go to the library in this order, so like the native
+    # wrapper the first one really sets transparency
+    n = m.w * m.h
+    m.transparent[:] = bytearray([bool(walkable)]) * n
+    m.walkable[:] = bytearray([bool(transparent)]) * n
+    m.fov[:] = bytearray(n)
+
+def _cast_ray(m, xo, yo, xd, yd, r2, light_walls):
+    """ bresenham from the origin towards xd, yd, lighting cells """
+    dx = abs(xd - xo)
+    dy = abs(yd - yo)
+    sx = xo < xd and 1 or -1
+    sy = yo < yd and 1 or -1
+    err = dx - dy
+    x, y = xo, yo
+    while (x, y) != (xd, yd):
+        e2 = 2 * err
+        if e2 > -dy:
+            err -= dy
+            x += sx
+        if e2 < dx:
+            err += dx
+            y += sy
+        if not (0 <= x < m.w and 0 <= y < m.h):
+            return
+        if r2 > 0 and (x - xo) ** 2 + (y - yo) ** 2 > r2:
+            return
+        i = y * m.w + x
+        if m.transparent[i]:
+            m.fov[i] = 1
+        else:
+            if light_walls:
+                m.fov[i] = 1
+            return
+
+def map_compute_fov(m, x, y, radius=0, light_walls=True, algo=FOV_RESTRICTIVE ):
+    # every algorithm is a basic ray cast here
+    m.fov[:] = bytearray(m.w * m.h)
+    m.fov[y * m.w + x] = 1
+    if radius > 0:
+        left, right = max(0, x - radius), min(m.w - 1, x + radius)
+        top, bottom = max(0, y - radius), min(m.h - 1, y + radius)
+    else:
+        left, right, top, bottom = 0, m.w - 1, 0, m.h - 1
+    r2 = radius * radius
+    for xd in range(left, right + 1):
+        _cast_ray(m, x, y, xd, top, r2, light_walls)
+        _cast_ray(m, x, y, xd, bottom, r2, light_walls)
+    for yd in range(top + 1, bottom):
+        _cast_ray(m, x, y, left, yd, r2, light_walls)
+        _cast_ray(m, x, y, right, yd, r2, light_walls)
+
+def map_is_in_fov(m, x, y):
+    return bool(m.fov[y * m.w + x])
+
+def map_is_transparent(m, x, y):
+    return bool(m.transparent[y * m.w + x])
+
+def map_is_walkable(m, x, y):
+    return bool(m.walkable[y * m.w + x])
+
+def map_delete(m):
+    pass
+
+def map_get_width(map):
+    return map.w
+
+def map_get_height(map):
+    return map.h
+
+
+############################
+# pathfinding module
+############################
+_NEIGHBOURS = ((-1, -1), (0, -1), (1, -1), (-1, 0)
+                , (1, 0), (-1, 1), (0, 1), (1, 1))
+
+def _steps(m, x, y, dcost):
+    """ walkable neighbours of a cell and the cost to step there """
+    for dx, dy in _NEIGHBOURS:
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < m.w and 0 <= ny < m.h and m.walkable[ny * m.w + nx]:
+            yield nx, ny, (dx and dy) and dcost or 1.0
+
+class Path(object):
+    def __init__(self, m, dcost):
+        self.map = m
+        self.dcost = dcost
+        self.origin = (0, 0)
+        self.destination = (0, 0)
+        self.cells = []
+
+def path_new_using_map(m, dcost=1.41):
+    return Path(m, dcost)
+
+def path_compute(p, ox, oy, dx, dy):
+    """ a* from origin to destination, the destination must be walkable """
+    m = p.map
+    p.origin = (ox, oy)
+    p.destination = (dx, dy)
+    p.cells = []
+    if (ox, oy) == (dx, dy) or not m.walkable[dy * m.w + dx]:
+        return False
+    cost = {(ox, oy): 0.0}
+    came_from = {}
+    heap = [(0.0, ox, oy)]
+    while heap:
+        f, x, y = heapq.heappop(heap)
+        if (x, y) == (dx, dy):
+            cell = (dx, dy)
+            while cell != (ox, oy):
+                p.cells.append(cell)
+                cell = came_from[cell]
+            p.cells.reverse()
+            return True
+        here = cost[(x, y)]
+        for nx, ny, step in _steps(m, x, y, p.dcost):
+            g = here + step
+            if g < cost.get((nx, ny), g + 1):
+                cost[(nx, ny)] = g
+                came_from[(nx, ny)] = (x, y)
+                h = max(abs(dx - nx), abs(dy - ny))
+                heapq.heappush(heap, (g + h, nx, ny))
+    return False
+
+def path_get_origin(p):
+    return p.origin
+
+def path_get_destination(p):
+    return p.destination
+
+def path_size(p):
+    return len(p.cells)
+
+def path_reverse(p):
+    if p.cells:
+        cells = [p.origin] + p.cells
+        cells.reverse()
+        p.origin = cells[0]
+        p.destination = cells[-1]
+        p.cells = cells[1:]
+
+def path_get(p, idx):
+    return p.cells[idx]
+
+def path_is_empty(p):
+    return not p.cells
+
+def path_walk(p, recompute):
+    if not p.cells:
+        return None,None
+    x, y = p.cells[0]
+    if not p.map.walkable[y * p.map.w + x]:
+        if not recompute or not path_compute(p, p.origin[0], p.origin[1]
+                                            , p.destination[0], p.destination[1]):
+            return None,None
+        x, y = p.cells[0]
+    del p.cells[0]
+    p.origin = (x, y)
+    return x, y
+
+def path_delete(p):
+    pass
+
+class Dijkstra(object):
+    def __init__(self, m, dcost):
+        self.map = m
+        self.dcost = dcost
+        self.root = None
+        self.distances = []
+        self.cells = []
+
+_UNREACHED = float("inf")
+
+def dijkstra_new(m, dcost=1.41):
+    return Dijkstra(m, dcost)
+
+def dijkstra_compute(p, ox, oy):
+    # distances are a flat list indexed y * width + x, like the map
+    m = p.map
+    w, h = m.w, m.h
+    walkable = m.walkable
+    moves = [(dx, dy, (dx and dy) and p.dcost or 1.0) for dx, dy in _NEIGHBOURS]
+    distances = [_UNREACHED] * (w * h)
+    distances[oy * w + ox] = 0.0
+    heap = [(0.0, ox, oy)]
+    pop = heapq.heappop
+    push = heapq.heappush
+    while heap:
+        d, x, y = pop(heap)
+        if d > distances[y * w + x]:
+            continue
+        for dx, dy, step in moves:
+            nx = x + dx
+            ny = y + dy
+            if 0 <= nx < w and 0 <= ny < h:
+                i = ny * w + nx
+                if walkable[i] and d + step < distances[i]:
+                    distances[i] = d + step
+                    push(heap, (d + step, nx, ny))
+    p.root = (ox, oy)
+    p.distances = distances
+
+def dijkstra_path_set(p, x, y):
+    w = p.map.w
+    if dijkstra_get_distance(p, x, y) < 0:
+        return False
+    cells = []
+    while (x, y) != p.root:
+        cells.append((x, y))
+        x, y = min([(nx, ny) for nx, ny, step in _steps(p.map, x, y, p.dcost)]
+                    , key=lambda cell: p.distances[cell[1] * w + cell[0]])
+    cells.reverse()
+    p.cells = cells
+    return True
+
+def dijkstra_get_distance(p, x, y):
+    m = p.map
+    if not p.distances or not (0 <= x < m.w and 0 <= y < m.h):
+        return -1.0
+    d = p.distances[y * m.w + x]
+    if d == _UNREACHED:
+        return -1.0
+    return d
+
+def dijkstra_size(p):
+    return len(p.cells)
+
+def dijkstra_reverse(p):
+    p.cells.reverse()
+
+def dijkstra_get(p, idx):
+    return p.cells[idx]
+
+def dijkstra_is_empty(p):
+    return not p.cells
+
+def dijkstra_path_walk(p):
+    if not p.cells:
+        return None,None
+    return p.cells.pop(0)
+
+def dijkstra_delete(p):
+    pass
@@ -0,0 +1,148 @@
+# compiled map pack: every ascii yard template in one binary file, read
+# through mmap and indexed by map number.
+#
+# file layout, all integers little endian:
+#
+#   magic       4s      "TDMP"
+#   version     H
+#   maps        H       count of map templates
+#   codes       H       length of the tile-code table
+#   code table  codes bytes, the ascii char for each tile code
+#   index       maps * (I offset, H width, H height)
+#   cells       one tile code byte per cell, row by row
+#
+# the pack isn't kept in git. the game builds it on first run, and again
+# whenever a data/maps/mapN file is newer than it. to build it by hand:
+#
+#   python mappack.py
+
+import os
+import mmap
+import struct
+
+MAGIC = "TDMP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHH")
+ENTRY = struct.Struct("<IHH")
+MAP_DIR = os.path.join("data", "maps")
+PACK_PATH = os.path.join(MAP_DIR, "maps.pack")
+
+def map_paths(map_dir=MAP_DIR):
+    """
+        The paths of the data/maps/mapN files, in order.
+    """
+    paths = []
+    while True:
+        path = os.path.join(map_dir, "map%s" % (len(paths) + 1))
+        if not os.path.exists(path):
+            return paths
+        paths.append(path)
+
+def read_ascii_maps(map_dir=MAP_DIR):
+    """
+        Read all data/maps/mapN files, in order, as lists of lines.
+    """
+    maps = []
+    for path in map_paths(map_dir):
+        f = open(path)
+        contents = f.read()
+        f.close()
+        maps.append(contents.rstrip("\n").split("\n"))
+    return maps
+
+def pack_outdated(map_dir=MAP_DIR, pack_path=PACK_PATH):
+    """
+        True if there is no map pack, or it doesn't have the map files as
+        they are now: of another version or count, or older than one.
+    """
+    if not os.path.exists(pack_path):
+        return True
+    f = open(pack_path, "rb")
+    header = f.read(HEADER.size)
+    f.close()
+    if len(header) < HEADER.size:
+        return True
+    magic, version, count, codes = HEADER.unpack(header)
+    paths = map_paths(map_dir)
+    if magic != MAGIC or version != VERSION or count != len(paths):
+        return True
+    built = os.path.getmtime(pack_path)
+    for path in paths:
+        if os.path.getmtime(path) > built:
+            return True
+    return False
+
+def build_map_pack(maps, pack_path=PACK_PATH):
+    """
+        Write the list of ascii maps into a map pack file.
+    """
+    codes = []
+    for lines in maps:
+        for line in lines:
+            for c in line:
+                if not c in codes:
+                    codes.append(c)
+    if not " " in codes:
+        # short lines get padded with grass
+        codes.append(" ")
+    if len(codes) > 255:
+        raise ValueError("map pack tile codes are limited to 255")
+    encode = dict((c, chr(i)) for i, c in enumerate(codes))
+    bodies = []
+    entries = []
+    offset = HEADER.size + len(codes) + ENTRY.size * len(maps)
+    for lines in maps:
+        width = max([len(line) for line in lines] or [0])
+        body = "".join("".join(encode[c] for c in line.ljust(width))
+                        for line in lines)
+        entries.append(ENTRY.pack(offset, width, len(lines)))
+        bodies.append(body)
+        offset = offset + len(body)
+    # written aside and renamed over, so a pack is never seen half done
+    temp_path = "%s.%s" % (pack_path, os.getpid())
+    f = open(temp_path, "wb")
+    f.write(HEADER.pack(MAGIC, VERSION, len(maps), len(codes)))
+    f.write("".join(codes))
+    f.write("".join(entries))
+    f.write("".join(bodies))
+    f.close()
+    os.rename(temp_path, pack_path)
+
+
+class MapPack(object):
+    """
+        Read-only access to a map pack file.
+        count is the number of maps, get(n) returns map n (1 based) as a
+        list of ascii lines, like the map files themselves.
+    """
+    def __init__(self, pack_path=PACK_PATH):
+        self.file = open(pack_path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, codes = HEADER.unpack(
+                                                self.data[:HEADER.size])
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %s map pack"
+                                % (pack_path, VERSION))
+        start = HEADER.size
+        code_table = self.data[start:start + codes]
+        # translate table from tile codes back to ascii chars
+        self.decode = code_table + "\0" * (256 - codes)
+        start = start + codes
+        self.index = [ENTRY.unpack(self.data[start + ENTRY.size * i:
+                                            start + ENTRY.size * (i + 1)])
+                        for i in range(self.count)]
+
+    def get(self, map_index):
+        offset, width, height = self.index[map_index - 1]
+        body = self.data[offset:offset + width * height].translate(self.decode)
+        return [body[y * width:(y + 1) * width] for y in range(height)]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+if __name__ == "__main__":
+    maps = read_ascii_maps()
+    build_map_pack(maps)
+    print("packed %s maps into %s" % (len(maps), PACK_PATH))
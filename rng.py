@@ -0,0 +1,127 @@
+#
+# seeded random streams.
+#
+# every game has one seed. each part of the game draws from its own named
+# stream, derived from that seed, so they don't disturb each other:
+#
+#   map       yard generation
+#   spawn     npcs, items, quests and where they go
+#   ai        npc movement
+#   player    player mechanics, like weakness bites
+#   flavour   message text
+#
+# map and spawn are reseeded for every level from (seed, level, attempt),
+# so a level can be rebuilt from the seed alone, however the game went
+# before it, or loaded from the level cache by that same key. the streams
+# live in a thread local context, so simulation threads, and the thread
+# building the next level ahead, each keep their own.
+#
+#   rng.seed(1234)
+#   x = rng.get("map").randint(0, 10)
+#
+
+import random
+import hashlib
+import threading
+
+LEVEL_STREAMS = ("map", "spawn")
+
+_local = threading.local()
+
+
+class RandomStreams(object):
+    """
+        Independent random.Random streams by name, from one seed.
+        Without a seed one is picked, and kept in .seed for replays.
+    """
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(32)
+        self.seed = seed
+        self.streams = {}
+        self.attempts = {}
+        self.level = None
+
+    def derive(self, *parts):
+        """ a random.Random seeded from the game seed and parts """
+        key = ":".join([str(self.seed)] + [str(part) for part in parts])
+        return random.Random(int(hashlib.md5(key).hexdigest(), 16))
+
+    def get(self, name):
+        stream = self.streams.get(name)
+        if stream is None:
+            if name in LEVEL_STREAMS and self.level is not None:
+                stream = self.derive(name, *self.level)
+            else:
+                stream = self.derive(name)
+            self.streams[name] = stream
+        return stream
+
+    def begin_level(self, level, retry=False):
+        """
+            Reseed the level streams for building this level. Coming to a
+            level again, in a new game, is the next attempt at it. A retry
+            after dying there rebuilds the same attempt.
+        """
+        if retry and level in self.attempts:
+            self.level = (level, self.attempts[level])
+        else:
+            self.level = self.next_level(level)
+            self.attempts[level] = self.level[1]
+        for name in LEVEL_STREAMS:
+            self.streams.pop(name, None)
+
+    def level_state(self):
+        """ where the level streams are at, for set_level_state() """
+        return dict((name, self.get(name).getstate())
+                    for name in LEVEL_STREAMS)
+
+    def set_level_state(self, state):
+        for name in LEVEL_STREAMS:
+            self.get(name).setstate(state[name])
+
+    def fork(self):
+        """
+            Streams from the same seed and level attempts, for building a
+            level on another thread. The other streams start afresh.
+        """
+        streams = RandomStreams(self.seed)
+        streams.attempts = dict(self.attempts)
+        return streams
+
+    def next_level(self, level):
+        """ the (level, attempt) begin_level(level) would start """
+        return (level, self.attempts.get(level, -1) + 1)
+
+    def adopt(self, other):
+        """
+            Take over the level streams of other, a fork that built the
+            level, as if it had been built here.
+        """
+        level, attempt = other.level
+        self.attempts[level] = attempt
+        self.level = other.level
+        for name in LEVEL_STREAMS:
+            self.streams[name] = other.get(name)
+
+
+def current():
+    """ this thread's streams """
+    streams = getattr(_local, "streams", None)
+    if streams is None:
+        streams = use(RandomStreams())
+    return streams
+
+def use(streams):
+    _local.streams = streams
+    return streams
+
+def seed(seed=None):
+    """ start this thread on fresh streams from seed """
+    return use(RandomStreams(seed))
+
+def get(name):
+    return current().get(name)
+
+def begin_level(level, retry=False):
+    current().begin_level(level, retry)
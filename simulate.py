@@ -0,0 +1,406 @@
+#
+# headless batch simulator: plays seeded games with a bot at the keys and
+# writes one line of json stats per game.
+#
+#   python simulate.py -n 100 -p greedy -o stats.jsonl
+#
+# the game runs on the headless libtcod backend, through the same
+# warp_level and game_turn calls the main loop makes. the tuning options
+# swap in other player constants or a level progression table, so their
+# effect can be measured over many games instead of by hand-play.
+#
+
+import os
+import sys
+import time
+import json
+import rng
+import optparse
+
+os.environ.setdefault("TOPDOG_HEADLESS", "1")
+
+import constants as C
+import factory
+import classes as cls
+import topdog
+
+# the bot stops after this many turns in one game
+MAX_TURNS = 5000
+# turns the greedy bot spends on quests in a yard before it leaves
+QUEST_PATIENCE = 400
+
+STEPS = ((-1, -1), (0, -1), (1, -1), (-1, 0)
+        , (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+#=========================================================[[ Bots ]]
+class Bot(object):
+    """
+        Chooses the player's next command each turn.
+        choose() returns a Command from the game's command registry.
+        The base bot drinks, eats and piddles when it needs to, and warps
+        as soon as it stands on a hole.
+    """
+    def __init__(self, commands):
+        self.commands = commands
+
+    def choose(self, player, game_map, game_objects):
+        return self.upkeep(player, game_map) \
+                or self.next_move(player, game_map, game_objects)
+
+    def upkeep(self, player, game_map):
+        bind = self.commands.bind
+        if player.can_warp(game_map):
+            return bind("warp")
+        if player.thirsty and game_map.tile(player.x, player.y).drinkable:
+            return bind("drink")
+        if player.mustpiddle:
+            return bind("piddle")
+        if player.carrying and player.carrying.edible \
+                and (player.weak or player.hp < 75):
+            return bind("eat")
+
+    def next_move(self, player, game_map, game_objects):
+        return self.commands.bind("move", *rng.get("bot").choice(STEPS))
+
+
+class RandomBot(Bot):
+    """ wanders about """
+    pass
+
+
+class HoleBot(Bot):
+    """
+        Follows a flow field toward the nearest hole in the fence.
+    """
+    def __init__(self, commands):
+        super(HoleBot, self).__init__(commands)
+        self.yard = None
+        self.open = None
+        self.water = None
+        self.field = None
+        self.yard_turns = 0
+
+    def choose(self, player, game_map, game_objects):
+        if self.yard is not game_map:
+            # new level
+            self.yard = game_map
+            self.open = open_cells(game_map)
+            self.water = set([xy for xy in self.open
+                            if game_map.tile(xy[0], xy[1]).drinkable])
+            self.field = flow_field(self.open, holes(game_map))
+            self.yard_turns = 0
+        self.yard_turns += 1
+        return super(HoleBot, self).choose(player, game_map, game_objects)
+
+    def next_move(self, player, game_map, game_objects):
+        return self.downhill(player, game_map, game_objects, self.field)
+
+    def downhill(self, player, game_map, game_objects, field):
+        """
+            Step to the neighbour closest to a target, around anyone in
+            the way unless they are the target. Like the player, it can't
+            step from one water tile into the next.
+        """
+        here = field.get((player.x, player.y))
+        in_water = game_map.tile(player.x, player.y).drinkable
+        best = []
+        for dx, dy in STEPS:
+            x, y = player.x + dx, player.y + dy
+            d = field.get((x, y))
+            if d and game_objects.blocking_at(x, y):
+                continue
+            if d is not None and in_water and game_map.tile(x, y).drinkable:
+                continue
+            if d is not None and (here is None or d < here):
+                if best and d < best[0][0]:
+                    best = []
+                if not best or d == best[0][0]:
+                    best.append((d, dx, dy))
+        if not best:
+            return Bot.next_move(self, player, None, None)
+        d, dx, dy = rng.get("bot").choice(best)
+        return self.commands.bind("move", dx, dy)
+
+
+class QuestBot(HoleBot):
+    """
+        Greedy quest seeker: hands in the item it carries, else fetches
+        the item for a quest it has, else visits the next quest giver.
+        With nothing left to do it heads for a hole.
+    """
+    def next_move(self, player, game_map, game_objects):
+        if self.yard_turns < QUEST_PATIENCE:
+            targets = quest_targets(player, game_objects)
+            blocked = set([(o.x, o.y) for o in game_objects if o.blocking])
+            step = first_step(self.open, self.water, (player.x, player.y)
+                            , targets, blocked)
+            if step:
+                return self.commands.bind("move", *step)
+        return super(QuestBot, self).next_move(player, game_map, game_objects)
+
+
+BOTS = {
+    "random": RandomBot
+    ,"holes": HoleBot
+    ,"greedy": QuestBot
+    }
+
+
+def holes(game_map):
+    return [(x, y) for x in range(C.MAP_WIDTH) for y in range(C.MAP_HEIGHT)
+            if game_map.tile(x, y).warp]
+
+def open_cells(game_map):
+    return set([(x, y) for x in range(C.MAP_WIDTH) for y in range(C.MAP_HEIGHT)
+                if not game_map.tile(x, y).blocking])
+
+def flow_field(open, targets):
+    """
+        Steps from each open cell to the nearest target, as a dict
+        of (x, y): steps. Beings don't block here.
+    """
+    field = dict((xy, 0) for xy in targets)
+    edge = list(targets)
+    while edge:
+        next_edge = []
+        for x, y in edge:
+            d = field[(x, y)] + 1
+            for dx, dy in STEPS:
+                xy = (x + dx, y + dy)
+                if xy in open and not xy in field:
+                    field[xy] = d
+                    next_edge.append(xy)
+        edge = next_edge
+    return field
+
+def first_step(open, water, start, targets, blocked):
+    """
+        Search breadth first from start to the nearest target, return the
+        first step there as (dx, dy), or None. Blocked cells are avoided
+        unless they are the target, and like the player the search can't
+        step from one water tile into the next.
+    """
+    targets = set(targets)
+    first = {start: None}
+    edge = [start]
+    while edge:
+        next_edge = []
+        for x, y in edge:
+            for dx, dy in STEPS:
+                xy = (x + dx, y + dy)
+                if xy in first:
+                    continue
+                if xy in targets:
+                    return first[(x, y)] or (dx, dy)
+                if xy in open and not xy in blocked \
+                        and not (xy in water and (x, y) in water):
+                    first[xy] = first[(x, y)] or (dx, dy)
+                    next_edge.append(xy)
+        edge = next_edge
+
+def quest_targets(player, game_objects):
+    """
+        Where the greedy bot goes next for its quests.
+    """
+    sought = set([quest.quest_id for quest in player.quests])
+    carried = player.carrying and player.carrying.quest_id
+    if carried and carried in sought:
+        return [(o.x, o.y) for o in game_objects
+                if getattr(o, "quest_ai", None) and not o.quest_ai.item
+                and o.quest_ai.quest_id == carried]
+    fetch = [(o.x, o.y) for o in game_objects if o is not player.carrying and (
+                getattr(o, "quest_id", None) in sought
+                or getattr(o, "quest_ai", None) and o.quest_ai.item
+                and o.quest_ai.quest_id in sought)]
+    if fetch:
+        return fetch
+    return [(o.x, o.y) for o in game_objects
+            if getattr(o, "quest_ai", None) and not o.quest_ai.item
+            and not o.quest_ai.quest_id in sought]
+
+
+#=========================================================[[ Games ]]
+def new_game(seed):
+    """
+        Set up topdog's globals for a fresh game, like the main loop does.
+    """
+    rng.seed(seed)
+    topdog.gamestate = cls.GameState()
+    topdog.gamestate.push(C.STATE_PLAYING)
+    for name in ("game_map", "fov_map", "path_map", "chase_map", "flee_map"
+                , "player_view", "game_objects", "npc_store"
+                , "level_builder"):
+        setattr(topdog, name, None)
+    topdog.save_screenshot = False
+    topdog.screenshot_saved = False
+    player = cls.Player()
+    aai = cls.ActionManual(player)
+    aai.attack_rating = 10
+    player.action_ai = aai
+    topdog.player = player
+    topdog.warp_level()
+    return player
+
+def play_game(seed, bot_class, max_turns=MAX_TURNS):
+    """
+        Play one game with a bot, return its stats.
+        stats["levels"] has a record per level played: hp coming in and
+        going out, turns spent, the turns it took to die each time we
+        died there, quests given and quests completed.
+    """
+    commands = topdog.setup_commands()
+    bot = bot_class(commands)
+    player = new_game(seed)
+    gamestate = topdog.gamestate
+    turns = 0
+    deaths = 0
+    won = False
+    levels = []
+    level = None
+    alive_turns = 0
+    while turns < max_turns:
+        if not level or level["level"] != player.level:
+            level = level_record(player)
+            levels.append(level)
+        state = gamestate.peek()
+        if state == C.STATE_DIALOGUE:
+            if topdog.player.dialogues:
+                topdog.player.dialogues.pop()
+            else:
+                gamestate.pop()
+        elif state == C.STATE_LOST:
+            deaths += 1
+            level["deaths"].append(alive_turns)
+            alive_turns = 0
+            gamestate.pop()
+            topdog.warp_level()
+        elif state == C.STATE_PLAYING:
+            before = set([quest.quest_id for quest in player.quests])
+            hp = player.hp
+            bot.choose(player, topdog.game_map, topdog.game_objects)()
+            turns += 1
+            alive_turns += 1
+            level["turns"] += 1
+            if player.level == level["level"]:
+                level["hp_out"] = player.hp
+                after = set([quest.quest_id for quest in player.quests])
+                level["given"] |= after
+                # quests only leave the list when handed in, or on a warp
+                if gamestate.peek() != C.STATE_LOST:
+                    level["completed"] |= before - after
+            else:
+                level["hp_out"] = hp
+        else:
+            won = state == C.STATE_VICTORY
+            break
+    if topdog.chase_map:
+        topdog.chase_map.close()
+    # the victory level is never played
+    levels = [level for level in levels if level["turns"]]
+    for level in levels:
+        level["quests"] = len(level.pop("given"))
+        level["completed"] = len(level["completed"])
+    return {
+        "seed": seed
+        ,"won": won
+        ,"level": player.level
+        ,"turns": turns
+        ,"moves": player.moves
+        ,"bites": player.bites_taken
+        ,"deaths": deaths
+        ,"score": player.score
+        ,"hp": player.hp
+        ,"quenches": player.quenches
+        ,"treats": player.treats_eaten
+        ,"piddles": player.piddles_taken
+        ,"levels": levels
+        }
+
+def level_record(player):
+    return {
+        "level": player.level
+        ,"hp_in": player.hp
+        ,"hp_out": player.hp
+        ,"turns": 0
+        ,"deaths": []
+        ,"given": set()
+        ,"completed": set()
+        }
+
+def add_tuning_options(parser):
+    parser.add_option("--thirst", type="int"
+                , help="override PLAYER_THIRST_INDEX")
+    parser.add_option("--weak-dice", type="int"
+                , help="override PLAYER_WEAK_HP_DICE")
+    parser.add_option("--progression"
+                , help="json file with a LEVEL_PROGRESSION table")
+
+def setup(thirst=None, weak_dice=None, progression=None, cache_dir=None):
+    """
+        Get ready to play, with other tuning values if given.
+        Built levels are cached in cache_dir, if given.
+    """
+    topdog.level_cache = None
+    if cache_dir:
+        topdog.level_cache = factory.LevelCache(os.path.abspath(cache_dir))
+    # game data paths are relative to the game directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    topdog.maps_avail = factory.count_available_maps()
+    if thirst:
+        C.PLAYER_THIRST_INDEX = thirst
+    if weak_dice:
+        C.PLAYER_WEAK_HP_DICE = weak_dice
+    if progression:
+        f = open(progression)
+        factory.LEVEL_PROGRESSION = json.load(f)
+        f.close()
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [options]"
+                , description="Play seeded games headless with a bot.")
+    parser.add_option("-n", "--games", type="int", default=10
+                , help="games to play (default %default)")
+    parser.add_option("-s", "--seed", type="int", default=0
+                , help="seed of the first game, each next game adds one")
+    parser.add_option("-p", "--policy", choices=sorted(BOTS), default="greedy"
+                , help="bot policy: %s (default %%default)"
+                        % (", ".join(sorted(BOTS))))
+    parser.add_option("-t", "--max-turns", type="int", default=MAX_TURNS
+                , help="turn limit per game (default %default)")
+    parser.add_option("-o", "--out", default=None
+                , help="write json stats lines here instead of stdout")
+    parser.add_option("--cache", default=None
+                , help="cache built levels in this directory, replaying "
+                       "the same seeds loads them from there")
+    add_tuning_options(parser)
+    options, args = parser.parse_args(argv)
+
+    # setup() moves to the game directory, paths given are from here
+    for name in ("out", "progression", "cache"):
+        if getattr(options, name):
+            setattr(options, name, os.path.abspath(getattr(options, name)))
+    setup(options.thirst, options.weak_dice, options.progression
+            , options.cache)
+    out = options.out and open(options.out, "w") or sys.stdout
+    turns = 0
+    levels = 0
+    started = time.time()
+    for seed in range(options.seed, options.seed + options.games):
+        stats = play_game(seed, BOTS[options.policy], options.max_turns)
+        stats["policy"] = options.policy
+        out.write(json.dumps(stats, sort_keys=True) + "\n")
+        turns += stats["turns"]
+        levels += stats["level"]
+    elapsed = max(time.time() - started, 1e-6)
+    if out is not sys.stdout:
+        out.close()
+    sys.stderr.write("%s games, %s turns in %.1fs: %d turns/s, mean level %.2f\n"
+                    % (options.games, turns, elapsed, turns / elapsed
+                    , float(levels) / max(options.games, 1)))
+    if topdog.level_cache:
+        sys.stderr.write("%s\n" % (topdog.level_cache))
+
+
+if __name__ == "__main__":
+    main()
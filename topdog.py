@@ -1,115 +1,161 @@
 import os
-import random
-import lib.libtcodpy as libtcod
+import rng
+from lib.backend import libtcod
 import constants as C
 import factory
 import classes as cls
 
-def setup_keyhandler():
+def setup_commands():
+    """
+        Register the commands keys can be bound to.
+    """
+    commands = cls.CommandRegistry()
+    commands.register("move", game_turn)
+    commands.register("back", go_back)
+    commands.register("play", lambda: gamestate.push(C.STATE_PLAYING))
+    commands.register("about", lambda: gamestate.push(C.STATE_ABOUT))
+    commands.register("stats", lambda: gamestate.push(C.STATE_STATS))
+    commands.register("help", lambda: gamestate.push(C.STATE_HELP))
+    commands.register("end-game", end_game)
+    commands.register("retry", retry_level)
+    commands.register("close-dialogue", lambda: player.dialogues.pop())
+    commands.register("warp", warp)
+    commands.register("wizard", wizard_mode)
+    commands.register("wizard-warp", wizard_warp)
+    commands.register("drink", lambda: player.quench_thirst(game_map))
+    commands.register("eat", lambda: player.eat_item())
+    commands.register("piddle", lambda: player.piddle(game_map))
+    return commands
+
+def setup_keyhandler(commands):
     """
         Setup our key handler for each state.
     """
     handler = cls.KeyHandler()
+    cmd = commands.bind
     handler.add_actions(C.STATE_MENU,
             {
-            "a": "gamestate.push(C.STATE_ABOUT)"
-            ,libtcod.KEY_SPACE: "gamestate.push(C.STATE_PLAYING)"
-            ,libtcod.KEY_ESCAPE: "gamestate.pop()"
+            "a": cmd("about")
+            ,libtcod.KEY_SPACE: cmd("play")
+            ,libtcod.KEY_ESCAPE: cmd("back")
             })
     handler.add_actions(C.STATE_VICTORY,
             {
-            libtcod.KEY_SPACE: "player = None; gamestate.pop()"
+            libtcod.KEY_SPACE: cmd("end-game")
             })
     handler.add_actions(C.STATE_LOST,
             {
-            libtcod.KEY_SPACE: "gamestate.pop(); warp_level()"
+            libtcod.KEY_SPACE: cmd("retry")
             })
     handler.add_actions(C.STATE_ABOUT,
             {
-            libtcod.KEY_SPACE: "gamestate.pop()"
-            ,libtcod.KEY_ESCAPE: "gamestate.pop()"
-            ,libtcod.KEY_KPENTER: "gamestate.pop()"
-            ,libtcod.KEY_ENTER: "gamestate.pop()"
+            libtcod.KEY_SPACE: cmd("back")
+            ,libtcod.KEY_ESCAPE: cmd("back")
+            ,libtcod.KEY_KPENTER: cmd("back")
+            ,libtcod.KEY_ENTER: cmd("back")
             })
     handler.add_actions(C.STATE_DIALOGUE,
             {
-            libtcod.KEY_SPACE: "player.dialogues.pop()"
-            ,libtcod.KEY_ESCAPE: "player.dialogues.pop()"
-            ,libtcod.KEY_KPENTER: "player.dialogues.pop()"
-            ,libtcod.KEY_ENTER: "player.dialogues.pop()"
+            libtcod.KEY_SPACE: cmd("close-dialogue")
+            ,libtcod.KEY_ESCAPE: cmd("close-dialogue")
+            ,libtcod.KEY_KPENTER: cmd("close-dialogue")
+            ,libtcod.KEY_ENTER: cmd("close-dialogue")
             })
     handler.add_actions(C.STATE_STATS,
             {
-            libtcod.KEY_SPACE: "gamestate.pop()"
-            ,libtcod.KEY_ESCAPE: "gamestate.pop()"
-            ,libtcod.KEY_KPENTER: "gamestate.pop()"
-            ,libtcod.KEY_ENTER: "gamestate.pop()"
-            ,libtcod.KEY_KP5: "gamestate.pop()"
+            libtcod.KEY_SPACE: cmd("back")
+            ,libtcod.KEY_ESCAPE: cmd("back")
+            ,libtcod.KEY_KPENTER: cmd("back")
+            ,libtcod.KEY_ENTER: cmd("back")
+            ,libtcod.KEY_KP5: cmd("back")
             })
     handler.add_actions(C.STATE_HELP,
             {
-            libtcod.KEY_SPACE: "gamestate.pop()"
-            ,libtcod.KEY_ESCAPE: "gamestate.pop()"
-            ,libtcod.KEY_KPENTER: "gamestate.pop()"
-            ,libtcod.KEY_KP5: "gamestate.pop()"
+            libtcod.KEY_SPACE: cmd("back")
+            ,libtcod.KEY_ESCAPE: cmd("back")
+            ,libtcod.KEY_KPENTER: cmd("back")
+            ,libtcod.KEY_KP5: cmd("back")
             })
     handler.add_actions(C.STATE_PLAYING,
             {
-            "q": "gamestate.pop()"
-            ,libtcod.KEY_ESCAPE: "gamestate.pop()"
-            ,libtcod.KEY_KP1: "game_turn(-1, 1)"
-            ,libtcod.KEY_KP2: "game_turn(0, 1)"
-            ,libtcod.KEY_KP3: "game_turn(1, 1)"
-            ,libtcod.KEY_KP4: "game_turn(-1, 0)"
-            ,libtcod.KEY_KP5: "gamestate.push(C.STATE_STATS)"
-            ,libtcod.KEY_KP6: "game_turn(1, 0)"
-            ,libtcod.KEY_KP7: "game_turn(-1, -1)"
-            ,libtcod.KEY_KP8: "game_turn(0, -1)"
-            ,libtcod.KEY_KP9: "game_turn(1, -1)"
-            ,libtcod.KEY_SPACE: "if player.can_warp(game_map): warp_level()"
-            ,libtcod.KEY_KPENTER: "if player.can_warp(game_map): warp_level()"
-            ,'b': "game_turn(-1, 1)"
-            ,'j': "game_turn(0, 1)"
-            ,'n': "game_turn(1, 1)"
-            ,'h': "game_turn(-1, 0)"
-            ,'l': "game_turn(1, 0)"
-            ,'y': "game_turn(-1, -1)"
-            ,'k': "game_turn(0, -1)"
-            ,'u': "game_turn(1, -1)"
-
-            ,libtcod.KEY_UP: "game_turn(0, -1)"
-            ,libtcod.KEY_DOWN: "game_turn(0, 1)"
-            ,libtcod.KEY_LEFT: "game_turn(-1, 0)"
-            ,libtcod.KEY_RIGHT: "game_turn(1, 0)"
-            ,libtcod.KEY_F11: "player.wizard = True"
-            ,libtcod.KEY_F12: "if player.wizard: warp_level()"
-            ,"d": "player.quench_thirst(game_map)"
-            ,libtcod.KEY_KPDIV: "player.quench_thirst(game_map)"
-            ,"e": "player.eat_item()"
-            ,libtcod.KEY_KPMUL: "player.eat_item()"
-            ,"p": "player.piddle(game_map)"
-            ,libtcod.KEY_KPSUB: "player.piddle(game_map)"
-            ,"i": "gamestate.push(C.STATE_STATS)"
-            ,"?": "gamestate.push(C.STATE_HELP)"
+            "q": cmd("back")
+            ,libtcod.KEY_ESCAPE: cmd("back")
+            ,libtcod.KEY_KP1: cmd("move", -1, 1)
+            ,libtcod.KEY_KP2: cmd("move", 0, 1)
+            ,libtcod.KEY_KP3: cmd("move", 1, 1)
+            ,libtcod.KEY_KP4: cmd("move", -1, 0)
+            ,libtcod.KEY_KP5: cmd("stats")
+            ,libtcod.KEY_KP6: cmd("move", 1, 0)
+            ,libtcod.KEY_KP7: cmd("move", -1, -1)
+            ,libtcod.KEY_KP8: cmd("move", 0, -1)
+            ,libtcod.KEY_KP9: cmd("move", 1, -1)
+            ,libtcod.KEY_SPACE: cmd("warp")
+            ,libtcod.KEY_KPENTER: cmd("warp")
+            ,'b': cmd("move", -1, 1)
+            ,'j': cmd("move", 0, 1)
+            ,'n': cmd("move", 1, 1)
+            ,'h': cmd("move", -1, 0)
+            ,'l': cmd("move", 1, 0)
+            ,'y': cmd("move", -1, -1)
+            ,'k': cmd("move", 0, -1)
+            ,'u': cmd("move", 1, -1)
+
+            ,libtcod.KEY_UP: cmd("move", 0, -1)
+            ,libtcod.KEY_DOWN: cmd("move", 0, 1)
+            ,libtcod.KEY_LEFT: cmd("move", -1, 0)
+            ,libtcod.KEY_RIGHT: cmd("move", 1, 0)
+            ,libtcod.KEY_F11: cmd("wizard")
+            ,libtcod.KEY_F12: cmd("wizard-warp")
+            ,"d": cmd("drink")
+            ,libtcod.KEY_KPDIV: cmd("drink")
+            ,"e": cmd("eat")
+            ,libtcod.KEY_KPMUL: cmd("eat")
+            ,"p": cmd("piddle")
+            ,libtcod.KEY_KPSUB: cmd("piddle")
+            ,"i": cmd("stats")
+            ,"?": cmd("help")
             })
+    # player rebindings
+    if os.path.exists(C.KEYMAP_PATH):
+        handler.load_keymap(C.KEYMAP_PATH, commands)
     return handler
 
 
+#=========================================================[[ Commands ]]
+def go_back():
+    gamestate.pop()
+
+def end_game():
+    global player
+    player = None
+    gamestate.pop()
+
+def retry_level():
+    gamestate.pop()
+    warp_level()
+
+def warp():
+    if player.can_warp(game_map):
+        warp_level()
+
+def wizard_mode():
+    player.wizard = True
+
+def wizard_warp():
+    if player.wizard:
+        warp_level()
+
+
 def game_turn(player_move_x, player_move_y):
     """
         Call all game turn actions.
     """
     if player.move(game_map, game_objects, player_move_x, player_move_y):
         # move NPC's
-        for npc in game_objects:
-            if isinstance(npc, cls.AnimalBase):
-                if npc.move_ai:
-                    npc.move_ai.take_turn(game_map, fov_map, path_map
-                                        ,game_objects, (player.x, player.y))
-        # recompute field of vision since we moved
-        libtcod.map_compute_fov(fov_map, player.x, player.y
-                                ,player.fov_radius
-                                ,C.FOV_LIGHT_WALLS, C.FOV_ALGO)
+        chase_map.update(player.x, player.y)
+        npc_store.take_turns(game_map, path_map, chase_map, flee_map, player)
+        # recompute field of vision if we moved
+        player_view.update(player.x, player.y, player.fov_radius)
     # are we still alive?
     if player.hp == 0:
         gamestate.push(C.STATE_LOST)
@@ -134,10 +180,10 @@ def blit_dialogues():
         libtcod.console_clear(0)
         dlg = player.dialogues[-1]
         if dlg.npc_picture:
-            icon = libtcod.image_load(os.path.join('data', 'images', dlg.npc_picture))
+            icon = images.get(dlg.npc_picture)
         else:
-            icon = libtcod.image_load(os.path.join('data', 'images', 'icon-%s.png' % (dlg.npc_name)))
-        frame = libtcod.image_load(os.path.join('data', 'images', 'dialogue-frame.png'))
+            icon = images.get('icon-%s.png' % (dlg.npc_name))
+        frame = images.get('dialogue-frame.png')
         libtcod.image_blit_rect(frame, 0, 0, 0, -1, -1, libtcod.BKGND_SET)
         libtcod.image_blit_rect(icon, 0, C.MAP_LEFT, C.MAP_TOP, -1, -1, libtcod.BKGND_SET)
         # title
@@ -167,7 +213,7 @@ def blit_player_stats():
         Draw player stats and quests screen.
     """
     libtcod.console_clear(0)
-    icon = libtcod.image_load(os.path.join('data', 'images', 'stats-frame.png'))
+    icon = images.get('stats-frame.png')
     libtcod.image_blit_rect(icon, 0, C.MAP_LEFT, C.MAP_TOP, -1, -1, libtcod.BKGND_SET)
     
     if player.carrying:
@@ -243,11 +289,13 @@ def blit_help():
     """
         Show help.
     """
-    libtcod.console_clear(0)
-    icon = libtcod.image_load(os.path.join('data', 'images', 'stats-frame.png'))
-    libtcod.image_blit_rect(icon, 0, C.MAP_LEFT, C.MAP_TOP, -1, -1, libtcod.BKGND_SET)
+    screens.show('help', draw_help)
+
+def draw_help(con):
+    icon = images.get('stats-frame.png')
+    libtcod.image_blit_rect(icon, con, C.MAP_LEFT, C.MAP_TOP, -1, -1, libtcod.BKGND_SET)
     
-    libtcod.console_print_ex(0, C.SCREEN_WIDTH / 2, 2,
+    libtcod.console_print_ex(con, C.SCREEN_WIDTH / 2, 2,
                         libtcod.BKGND_NONE, libtcod.CENTER, 
                         "%cTop Dog%c\nv%s\n^_^" % (C.COL5, C.COLS, C.VERSION))
                             
@@ -275,7 +323,7 @@ diagonals are the dog's bark. Keypad 5 shows your stats, as does [i]nfo. The %cA
     helptext.append("\nNow go find that %cPuppy!%c" % (C.COL5, C.COLS))
     helptext.append("\nWOOF!")
 
-    libtcod.console_print_rect(0, 4, 10, C.MAP_WIDTH - 4, C.MAP_HEIGHT - 2,
+    libtcod.console_print_rect(con, 4, 10, C.MAP_WIDTH - 4, C.MAP_HEIGHT - 2,
                         "\n".join(helptext))
 #    libtcod.console_flush()
 #    
@@ -286,9 +334,15 @@ diagonals are the dog's bark. Keypad 5 shows your stats, as does [i]nfo. The %cA
 #            break
 
 def blit_victory():
-    libtcod.console_clear(0)
-    frame = libtcod.image_load(os.path.join('data', 'images', 'about-frame.png'))
-    libtcod.image_blit_rect(frame, 0, 0, 0, -1, -1, libtcod.BKGND_SET)
+    # redraw only if the stats changed since last time
+    stats = (player.moves, player.quenches, player.bites_taken
+            , player.treats_eaten, player.piddles_taken, player.score
+            , screenshot_saved)
+    screens.show('victory', draw_victory, stats)
+
+def draw_victory(con):
+    frame = images.get('about-frame.png')
+    libtcod.image_blit_rect(frame, con, 0, 0, -1, -1, libtcod.BKGND_SET)
     results = ["You won, Top Dog!"]
     results.append("You moved %s times." % (player.moves))
     results.append("You drank %s puddles." % (player.quenches))
@@ -297,16 +351,21 @@ def blit_victory():
     results.append("You piddled %s times." % (player.piddles_taken))
     results.append("Your score is %s!" % (player.score))
     results.append("Well Done ^_^")
-    libtcod.console_print_ex(0, C.SCREEN_WIDTH / 2, 4,
+    libtcod.console_print_ex(con, C.SCREEN_WIDTH / 2, 4,
                         libtcod.BKGND_NONE, libtcod.CENTER, "\n\n".join(results))
+    if screenshot_saved:
+        libtcod.console_print_ex(con, 4, 40,
+                        libtcod.BKGND_NONE, libtcod.LEFT, "(screenshot saved)")
 
 def blit_lost():
-    libtcod.console_clear(0)
-    frame = libtcod.image_load(os.path.join('data', 'images', 'dialogue-frame.png'))
-    libtcod.image_blit_rect(frame, 0, 0, 0, -1, -1, libtcod.BKGND_SET)
-    icon = libtcod.image_load(os.path.join('data', 'images', 'icon-paw.png'))
-    libtcod.image_blit_rect(icon, 0, C.MAP_LEFT, C.MAP_TOP, -1, -1, libtcod.BKGND_SET)
-    libtcod.console_print_ex(0, C.SCREEN_WIDTH / 2, 4,
+    screens.show('lost', draw_lost)
+
+def draw_lost(con):
+    frame = images.get('dialogue-frame.png')
+    libtcod.image_blit_rect(frame, con, 0, 0, -1, -1, libtcod.BKGND_SET)
+    icon = images.get('icon-paw.png')
+    libtcod.image_blit_rect(icon, con, C.MAP_LEFT, C.MAP_TOP, -1, -1, libtcod.BKGND_SET)
+    libtcod.console_print_ex(con, C.SCREEN_WIDTH / 2, 4,
                         libtcod.BKGND_NONE, libtcod.CENTER, \
                         "Ouch! You lost all your health.\n\n" \
                         "You rest to retry this level.\n\n" \
@@ -314,38 +373,42 @@ def blit_lost():
 
 
 def blit_menu():
-    libtcod.console_clear(0)
-    icon = libtcod.image_load(os.path.join('data', 'images', 'intro.png'))
-    libtcod.image_blit_rect(icon, 0, 0, 0, -1, -1, libtcod.BKGND_SET)
+    screens.show('menu', draw_menu)
+
+def draw_menu(con):
+    icon = images.get('intro.png')
+    libtcod.image_blit_rect(icon, con, 0, 0, -1, -1, libtcod.BKGND_SET)
     text = [
         "version %s" % (C.VERSION)
         ,"%cA%cbout" % (C.COL1, C.COLS)
         ,"%cspace%c to continue"  % (C.COL4, C.COLS)
         ]
-    libtcod.console_print_ex(0, 2, 45,
+    libtcod.console_print_ex(con, 2, 45,
                         libtcod.BKGND_NONE, libtcod.LEFT, 
                         "\n".join(text))
-    libtcod.console_print_ex(0, C.SCREEN_WIDTH / 2, 24,
+    libtcod.console_print_ex(con, C.SCREEN_WIDTH / 2, 24,
                         libtcod.BKGND_NONE, libtcod.CENTER, 
                         "in 'The Lost Puppy'")
 
 def blit_about():
-    libtcod.console_clear(0)
-    icon = libtcod.image_load(os.path.join('data', 'images', 'about-frame.png'))
-    libtcod.image_blit_rect(icon, 0, 0, 0, -1, -1, libtcod.BKGND_SET)
+    screens.show('about', draw_about)
+
+def draw_about(con):
+    icon = images.get('about-frame.png')
+    libtcod.image_blit_rect(icon, con, 0, 0, -1, -1, libtcod.BKGND_SET)
     try:
         readme = file('README', 'r')
     except IOError, e:
-        libtcod.console_print_ex(0, 2, 2,
+        libtcod.console_print_ex(con, 2, 2,
                         libtcod.BKGND_NONE, libtcod.LEFT, 
                         "Error: about file not found :'(")
         return None
     readme_text = readme.read()
     readme.close()
-    libtcod.console_print_rect(0, 2, 2, C.MAP_WIDTH - 3, C.MAP_HEIGHT - 4,
+    libtcod.console_print_rect(con, 2, 2, C.MAP_WIDTH - 3, C.MAP_HEIGHT - 4,
                         readme_text)
 
-    libtcod.console_print_ex(0, 2, 47,
+    libtcod.console_print_ex(con, 2, 47,
                         libtcod.BKGND_NONE, libtcod.LEFT, 
                         "%cspace%c to return"  % (C.COL4, C.COLS))
 
@@ -354,52 +417,59 @@ def draw_map():
     """
         Draw the map tiles onto the canvas.
     """
-    for y in range(C.MAP_HEIGHT - 0):
-        for x in range(C.MAP_WIDTH - 0):
-            tile = game_map[x][y]
-            if player.wizard or libtcod.map_is_in_fov(fov_map, x, y):
-                tile.seen = True
-                libtcod.console_put_char_ex(canvas, x, y, 
-                                            tile.char, tile.fgcolor, tile.bgcolor)
-            elif tile.seen:
-                libtcod.console_put_char_ex(canvas, x, y, tile.char
-                                        ,libtcod.black, libtcod.darkest_grey)
+    if player.wizard:
+        in_view = game_map.everything()
+    else:
+        in_view = player_view.mask
+    game_map.update_seen(in_view)
+    renderer.put_map(game_map, in_view)
 
 def draw_objects():
     """
         Place all map objects on the canvas.
     """
+    if player.wizard:
+        nearby = game_objects
+    else:
+        # nothing beyond our fov radius can be in view
+        radius = player.fov_radius
+        nearby = game_objects.in_rect(player.x - radius, player.y - radius
+                                    ,player.x + radius, player.y + radius)
+    items = []
+    npcs = []
+    for obj in nearby:
+        if not isinstance(obj, cls.AnimalBase):
+            items.append(obj)
+        elif not obj is player:
+            npcs.append(obj)
+
     # items and non-NPC's
-    for obj in [e for e in game_objects if not isinstance(e, cls.AnimalBase)]:
+    for obj in items:
         if obj.x > 0:   #TODO replace with a visible property
-            if player.wizard or libtcod.map_is_in_fov(fov_map, obj.x, obj.y):
+            if player.wizard or player_view.in_view(obj.x, obj.y):
                 player.msg("You see %c%s%c" % (C.COL3, obj.name, C.COLS)
                                                 , allow_duplicates=False)
-                libtcod.console_put_char_ex(canvas, obj.x, obj.y, 
-                                            obj.char, obj.fgcolor, obj.bgcolor)
+                renderer.put(obj.x, obj.y, obj.char, obj.fgcolor, obj.bgcolor)
     
     # NPC's
-    for obj in [e for e in game_objects if isinstance(e, cls.AnimalBase) and 
-        not isinstance(e, cls.Player)]:
+    for obj in npcs:
         if obj.x > 0:   #TODO replace with a visible property
-            if player.wizard or libtcod.map_is_in_fov(fov_map, obj.x, obj.y):
+            if player.wizard or player_view.in_view(obj.x, obj.y):
                 player.msg("You see %c%s%c" % (C.COL4, obj.name, C.COLS)
                                                 , allow_duplicates=False)
                 if obj.see_message:
                     player.msg("%c%s%c" % (C.COL2, obj.see_message, C.COLS)
                                                 ,allow_duplicates=False)
                 # draw the NPC background color to match the map
-                libtcod.console_put_char_ex(canvas, obj.x, obj.y, 
-                                            obj.char, obj.fgcolor
-                                            , game_map[obj.x][obj.y].bgcolor)
+                renderer.put(obj.x, obj.y, obj.char, obj.fgcolor
+                            ,game_map.tile(obj.x, obj.y).bgcolor)
     # draw player to match the map background
-    libtcod.console_put_char_ex(canvas, player.x, player.y, 
-                                player.char, player.fgcolor
-                                , game_map[player.x][player.y].bgcolor)
+    renderer.put(player.x, player.y, player.char, player.fgcolor
+                ,game_map.tile(player.x, player.y).bgcolor)
 
 def object_at(x, y):
-    for obj in game_objects:
-        if obj.x == x and obj.y == y and not obj is player:
+    for obj in game_objects.at(x, y):
+        if not obj is player:
             return obj
 
 def draw_player_stats():
@@ -408,7 +478,7 @@ def draw_player_stats():
     """
     tile = object_at(player.x, player.y)
     if not tile:
-        tile = game_map[player.x][player.y]
+        tile = game_map.tile(player.x, player.y)
     # the object/tile name player is standing on
     libtcod.console_print_ex(0, 2 + (C.MAP_WIDTH / 2), 
                             C.SCREEN_HEIGHT - 2, 
@@ -481,12 +551,21 @@ def warp_level():
     """
     global game_map
     global fov_map
+    global player_view
     global path_map
+    global chase_map
+    global flee_map
     global game_objects
     global player
     global maps_avail
+    global level_builder
+    global level_cache
+    global npc_store
     global save_screenshot
+    global screenshot_saved
 
+    # dying starts the same yard over
+    retry = player.hp == 0
     #prepare ftl
     player.warp_prep()
     player.wizard = False
@@ -504,40 +583,73 @@ def warp_level():
         gamestate.push(C.STATE_VICTORY)
         gamestate.push(C.STATE_DIALOGUE)
         save_screenshot = True
+        screenshot_saved = False
     else:
-        # init new maps
-        game_map, fov_map, path_map = factory.generate_map(maps_avail)
-        # add player, NPC's, foliage, food
-        game_objects = [player]
-        # add level npcs, food, items
-        game_objects.extend(factory.spawn_level_objects(game_map, player.level))
-        # add level quests and story
-        factory.spawn_level_quests(game_map, game_objects, player.level)
+        # swap in the level built ahead, else build it now from this
+        # level's random streams
+        level = None
+        if level_builder:
+            level = level_builder.take(player.level)
+        if level is None:
+            rng.begin_level(player.level, retry)
+            level = factory.build_level(maps_avail, player.level, level_cache)
+        game_map, fov_map, path_map, level_objects = level
+        player_view = cls.FovView(game_map, fov_map)
+        if chase_map:
+            chase_map.close()
+        chase_map = cls.ChaseMap(fov_map)
+        flee_map = factory.get_flee_map(chase_map, game_map)
+        # add player, level npcs, food, items and quests
+        game_objects = cls.ObjectIndex([player])
+        game_objects.extend(level_objects)
+        # add the story, it needs the player
         factory.spawn_level_storyline(game_map, game_objects, player)
+        # start on the next level while this one is played
+        if level_builder and player.level < 9:
+            level_builder.start(player.level + 1)
 
         # compute field of vision
-        libtcod.map_compute_fov(fov_map, player.x, player.y
-                                ,player.fov_radius, C.FOV_LIGHT_WALLS, C.FOV_ALGO)
+        player_view.update(player.x, player.y, player.fov_radius)
         # carry our inventory item into this new level
         if player.carrying:
             game_objects.append(player.carrying)
+        npc_store = factory.get_entity_store(game_objects)
 
 
 if __name__ == "__main__":
     """
         Entry point.
     """
+    # TOPDOG_SEED replays a game, the seed is printed at startup
+    streams = rng.seed(os.environ.get("TOPDOG_SEED"))
+    print("seed %s" % (streams.seed))
     canvas = factory.init_libtcod()
-    mullions = libtcod.image_load(os.path.join('data', 'images','background.png'))
-    kb_handler = setup_keyhandler()
+    renderer = factory.get_renderer(canvas)
+    images = cls.ImageCache(os.path.join('data', 'images'))
+    images.preload(C.SCREEN_IMAGES)
+    mullions = images.get('background.png')
+    screens = cls.ScreenCache(C.SCREEN_WIDTH, C.SCREEN_HEIGHT)
+    kb_handler = setup_keyhandler(setup_commands())
     gamestate = cls.GameState()
     maps_avail = factory.count_available_maps()
+    # built levels stay in memory for death retries. only replays, that
+    # build the same levels again, keep them on disk, and read them back
+    cache_dir = None
+    if os.environ.get("TOPDOG_SEED"):
+        cache_dir = C.LEVEL_CACHE_DIR
+    level_cache = factory.LevelCache(cache_dir)
+    level_builder = factory.LevelBuilder(maps_avail, level_cache)
     game_map = None
     path_map = None
+    chase_map = None
+    flee_map = None
     fov_map = None
+    player_view = None
     game_objects = None
+    npc_store = None
     player = None
     save_screenshot = False
+    screenshot_saved = False
     
     while not libtcod.console_is_window_closed():
         state = gamestate.peek()
@@ -552,13 +664,14 @@ if __name__ == "__main__":
                 aai.attack_rating = 10
                 player.action_ai = aai
                 warp_level()
-            # clear our displays
+            # clear our displays. the canvas only gets the cells that change
             libtcod.console_clear(0)
-            libtcod.console_clear(canvas)
+            renderer.clear()
             # draw screens
             draw_map()
             draw_player_stats()
             draw_objects()
+            renderer.present()
             blit_playtime()
             draw_messages()
         elif state == C.STATE_DIALOGUE:
@@ -574,22 +687,27 @@ if __name__ == "__main__":
         elif state == C.STATE_VICTORY:
             blit_victory()
             if save_screenshot:
+                # shoot the screen without the notice, then keep it on
                 save_screenshot = False
                 libtcod.console_flush()
                 libtcod.sys_save_screenshot(None)
-                libtcod.console_print_ex(0, 4, 40,
-                                libtcod.BKGND_NONE, libtcod.LEFT, "(screenshot saved)")
+                screenshot_saved = True
+                blit_victory()
         elif state == C.STATE_LOST:
             blit_lost()
         if gamestate.is_empty():
             break
         libtcod.console_flush()
-        cmd = kb_handler.handle_stroke(gamestate.peek())
-        if cmd:
-            exec cmd
+        # run everything typed since the last frame, then draw once
+        kb_handler.poll()
+        kb_handler.run_pending(gamestate, C.KEYS_PER_FRAME)
     # shut down
     if path_map:
-        libtcod.dijkstra_delete(path_map)
+        libtcod.path_delete(path_map)
+    if chase_map:
+        chase_map.close()
+    screens.free_all()
+    images.free_all()
     if canvas:
         libtcod.console_delete(canvas)
     libtcod.console_clear(0)